@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional
+from config import logger
+
+_SECTION_NAMES = ("xml_fields_data", "existing_attributes_data")
+
+
+def _normalize_section(prompt: str, section: str) -> Any:
+    """Extracts a JSON section of the prompt in a canonical, order-independent form."""
+    match = re.search(rf"<{section}>\n(.*?)\n</{section}>", prompt, re.S)
+    if not match:
+        return None
+    raw = match.group(1)
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return " ".join(raw.split())
+    if isinstance(data, list):
+        data = sorted(data, key=lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False))
+    return data
+
+
+class AIResponseCache:
+    """
+    Content-addressed on-disk cache of validated attribute lists returned by the model.
+    The key covers the model, its options, the output format and the normalized
+    XML-field and existing-attribute sections of the prompt, so the same layout
+    re-run against another template hits the cache. Total size is bounded; least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, options: Dict[str, Any], prompt: str, response_format: Any = None) -> str:
+        key_data = {
+            "model": model,
+            "options": options,
+            "format": response_format,
+            "sections": {name: _normalize_section(prompt, name) for name in _SECTION_NAMES},
+        }
+        encoded = json.dumps(key_data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+                os.utime(path)
+            except (OSError, json.JSONDecodeError):
+                self.misses += 1
+                return None
+            self.hits += 1
+        logger.info(f"AI response cache hit ({key[:12]}).")
+        return entry["items"]
+
+    def put(self, key: str, items: List[Dict[str, Any]]):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created_at": time.time(), "items": items}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            logger.debug(f"AI response cache: evicted {name}")
@@ -1,107 +1,232 @@
-import requests
+import asyncio
 import json
-import time
-from typing import List, Dict, Any
-from config import OLLAMA_API_URL, OLLAMA_MODEL, logger
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
+import aiohttp
+from ai_cache import AIResponseCache
+from attribute_schema import CREATE_PROPERTY_RESPONSE_SCHEMA, validate_attribute_item
+from async_http import get_async_session, run_sync
+from json_extract import JsonArrayStreamParser, scan_json_array
+from llm_pool import LLMBackend, LLMPool, build_pool_from_config
+from config import (
+    OLLAMA_MODEL, OLLAMA_FORMAT, OLLAMA_NUM_CTX, OLLAMA_KEEP_ALIVE, AI_CACHE_DIR, AI_CACHE_MAX_BYTES, VERBOSE, logger
+)
+from metrics import metrics, timed
 
-def query_ai_ollama(prompt: str, template_id: str) -> List[Dict[str, Any]]:
+ai_response_cache: Optional[AIResponseCache] = AIResponseCache(AI_CACHE_DIR, AI_CACHE_MAX_BYTES) if AI_CACHE_DIR else None
+# Бэкенды Ollama; модель в payload — OLLAMA_MODEL, при отправке подставляется модель бэкенда.
+# В кэше ответ хранится под моделью, которая его дала, поэтому ответы других моделей не выдаются за OLLAMA_MODEL
+ollama_pool: LLMPool = build_pool_from_config()
+
+
+def _debug_dump(title: str, render: Callable[[], str]):
+    """Prints a debug block only in verbose mode; the text is rendered lazily."""
+    if not VERBOSE:
+        return
+    print("\n" + "="*20 + f" {title} " + "="*20)
+    print(render())
+    print("="*20 + f" END {title} " + "="*20 + "\n")
+
+
+def _record_invalid_response(error: ValueError):
+    logger.error(f"Value error processing Ollama response: {error}")
+    metrics.increment("ollama_invalid_responses")
+
+
+def _record_retry(wait_time: float):
+    metrics.increment("ollama_retries")
+    metrics.increment("ollama_backoff_seconds", wait_time)
+
+
+def _cache_key(payload: Dict[str, Any], model: str) -> str:
+    return AIResponseCache.make_key(model, payload["options"], payload["prompt"], payload.get("format"))
+
+
+def _cached_response(payload: Dict[str, Any], template_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Looks the prompt up in the response cache and retargets hits to the given template."""
+    if ai_response_cache is None:
+        return None
+    items = ai_response_cache.get(_cache_key(payload, payload["model"]))
+    if items is None:
+        metrics.increment("ai_cache_misses")
+        return None
+    metrics.increment("ai_cache_hits")
+    for item in items:
+        item['containerId'] = template_id
+    return items
+
+
+def _store_response(payload: Dict[str, Any], model: str, items: List[Dict[str, Any]]):
+    """Caches an answer under the model that actually produced it."""
+    if ai_response_cache is not None:
+        ai_response_cache.put(_cache_key(payload, model), items)
+
+
+def _extract_attribute_list(response_text: str) -> Tuple[List[Dict[str, Any]], bool]:
     """
-    Sends the prompt to the local Ollama model and retrieves the generated JSON list
-    in the final Platform API format.
-    Includes basic retry logic.
+    Extracts the attribute definitions from the model's answer, keeping every
+    item that passes the CreateProperty schema even if others are broken.
+    Also returns whether the answer was complete and may be cached.
     """
+    items, complete = scan_json_array(response_text)
+    validated_json_list = [item for item in items if validate_attribute_item(item)]
+    if items and not validated_json_list:
+        raise ValueError(f"None of the {len(items)} generated items match the CreateProperty schema.")
+    logger.info(f"Successfully processed {len(validated_json_list)} attribute definitions from Ollama.")
+    return validated_json_list, complete
+
+
+def _build_payload(prompt: str, stream: bool) -> Dict[str, Any]:
     payload = {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
-        "stream": False,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
         "options": {
             "temperature": 0.5,
-            "num_predict": -1
+            "num_predict": -1,
+            "num_ctx": OLLAMA_NUM_CTX
         }
     }
-    max_retries = 3
+    if OLLAMA_FORMAT == "json":
+        payload["format"] = "json"
+    elif OLLAMA_FORMAT == "schema":
+        payload["format"] = CREATE_PROPERTY_RESPONSE_SCHEMA
+    return payload
+
+
+def _backend_payload(backend: LLMBackend, payload: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(payload, model=backend.model)
 
+
+# --- asyncio-клиент Ollama ---
+
+def _ollama_async_session() -> aiohttp.ClientSession:
+    return get_async_session("ollama", 4 * len(ollama_pool.backends))
+
+
+async def _post_generate_async(backend: LLMBackend, payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Returns the model that answered and its response."""
+    logger.info(f"Sending request to Ollama {backend.model} at {backend.url}...")
+    async with _ollama_async_session().post(backend.url, json=_backend_payload(backend, payload),
+                                            timeout=aiohttp.ClientTimeout(total=300)) as response:
+        metrics.record_http_status("ollama", response.status)
+        response.raise_for_status()
+        return backend.model, await response.json(content_type=None)
+
+
+@timed("query_ai_ollama")
+async def query_ai_ollama_async(prompt: str, template_id: str) -> List[Dict[str, Any]]:
+    """
+    Sends the prompt to the local Ollama model and retrieves the generated JSON list
+    in the final Platform API format. Retries transport errors and invalid answers.
+    """
+    payload = _build_payload(prompt, stream=False)
+    cached = _cached_response(payload, template_id)
+    if cached is not None:
+        return cached
+
+    max_retries = 3
     for attempt in range(max_retries):
         try:
-            logger.info(f"Sending request to local Ollama {OLLAMA_MODEL} (Attempt {attempt + 1}/{max_retries})...")
-            
-            print("\n" + "="*20 + " PROMPT TO OLLAMA " + "="*20)
-            print(prompt)
-            print("="*20 + " END PROMPT " + "="*20 + "\n")
-
-            response = requests.post(OLLAMA_API_URL, json=payload, timeout=300)
-            response.raise_for_status()
-            response_data = response.json()
+            logger.info(f"Querying Ollama (Attempt {attempt + 1}/{max_retries})...")
+            _debug_dump("PROMPT TO OLLAMA", lambda: prompt)
+            model, response_data = await ollama_pool.call_async(lambda backend: _post_generate_async(backend, payload))
+            metrics.record_ollama_usage(response_data)
             response_text = response_data.get('response', '').strip()
-
-            print("\n" + "="*20 + " OLLAMA RAW RESPONSE " + "="*20)
-            print(response_text)
-            print("="*20 + " END RAW RESPONSE " + "="*20 + "\n")
-            
+            _debug_dump("OLLAMA RAW RESPONSE", lambda: response_text)
             logger.debug(f"Raw Ollama response: {response_text}")
 
             if not response_text:
                 logger.warning("Ollama returned empty response.")
                 return []
 
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']')
-            
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx+1]
-                
-                try:
-                    temp_json_list = json.loads(json_str)
-                    
-                    if not isinstance(temp_json_list, list):
-                        logger.error(f"Extracted JSON is not a list: {type(temp_json_list)}")
-                        raise ValueError("Extracted JSON format is incorrect.")
-                    
-                    validated_json_list = []
-                    for item in temp_json_list:
-                        if isinstance(item, dict):
-                            if all(key in item for key in ['containerId', 'alias', 'type', 'attributes']):
-                                if isinstance(item['attributes'], dict):
-                                    validated_json_list.append(item)
-                                else:
-                                    logger.warning(f"Skipping item, 'attributes' is not a dict: {item}")
-                            else:
-                                logger.warning(f"Skipping item with missing Platform API keys: {item}")
-                        else:
-                            logger.warning(f"Skipping non-dict item in list: {item}")
-                    
-                    logger.info(f"Successfully processed {len(validated_json_list)} attribute definitions from Ollama.")
-
-                    print("\n" + "="*20 + " PROCESSED JSON FOR PLATFORM " + "="*20)
-                    print(json.dumps(validated_json_list, indent=2, ensure_ascii=False))
-                    print("="*20 + " END PROCESSED JSON " + "="*20 + "\n")
-                    
-                    return validated_json_list
-                    
-                except json.JSONDecodeError as je:
-                    logger.error(f"Failed to decode extracted JSON string: {je}")
-                    logger.error(f"Extracted JSON string was: {repr(json_str)}")
-                    
+            validated_json_list, complete = _extract_attribute_list(response_text)
+            if complete:
+                _store_response(payload, model, validated_json_list)
             else:
-                logger.error("Could not find a valid JSON array structure (brackets) in Ollama response.")
-                
-            raise ValueError("No valid JSON array found in Ollama response.")
-
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP Error {response.status_code} from Ollama API: {e.response.text}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error calling Ollama API: {e}")
+                logger.warning("Ollama answer is truncated or quotes an empty array in prose; it is not cached.")
+            return validated_json_list
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Request error calling Ollama API: {e!r}")
         except ValueError as ve:
-            logger.error(f"Value error processing Ollama response: {ve}")
-            raise 
-        except Exception as e:
-            logger.error(f"Unexpected error calling Ollama API: {e}")
-        
+            _record_invalid_response(ve)
+
         if attempt < max_retries - 1:
             wait_time = 2 ** attempt
             logger.info(f"Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-        else:
-            logger.error("Max retries reached for Ollama API call.")
-            raise
-    return []
\ No newline at end of file
+            _record_retry(wait_time)
+            await asyncio.sleep(wait_time)
+
+    logger.error("Max retries reached for Ollama API call.")
+    raise RuntimeError("Ollama request failed.")
+
+
+@timed("query_ai_ollama")
+async def stream_ai_ollama_async(prompt: str, template_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams the completion from Ollama and yields each validated attribute
+    definition as soon as its JSON object is closed by the model.
+    Retries only while nothing has been yielded yet.
+    """
+    payload = _build_payload(prompt, stream=True)
+    cached = _cached_response(payload, template_id)
+    if cached is not None:
+        for item in cached:
+            yield item
+        return
+
+    max_retries = 3
+    for attempt in range(max_retries):
+        parser = JsonArrayStreamParser()
+        streamed_items = []
+        try:
+            with ollama_pool.lease() as backend:
+                logger.info(f"Streaming request to Ollama {backend.model} at {backend.url} (Attempt {attempt + 1}/{max_retries})...")
+                async with _ollama_async_session().post(backend.url, json=_backend_payload(backend, payload),
+                                                        timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=300)) as response:
+                    metrics.record_http_status("ollama", response.status)
+                    response.raise_for_status()
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        if event.get('error'):
+                            raise ValueError(f"Ollama stream error: {event['error']}")
+                        for item in parser.feed(event.get('response', '')):
+                            if validate_attribute_item(item):
+                                streamed_items.append(item)
+                                yield item
+                        if event.get('done'):
+                            metrics.record_ollama_usage(event)
+                        if event.get('done') or parser.done:
+                            break
+
+            if not parser.found_array:
+                raise ValueError("No valid JSON array found in Ollama response.")
+            logger.info(f"Streamed {len(streamed_items)} attribute definitions from Ollama.")
+            if parser.complete:
+                _store_response(payload, backend.model, streamed_items)
+            else:
+                logger.warning("Ollama stream ended before the JSON array was closed or only quoted an empty array; the answer is not cached.")
+            return
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"Error streaming from Ollama API: {e!r}")
+            if streamed_items:
+                logger.error("Stream broke after partial output; not retrying to avoid duplicates.")
+                return
+
+        if attempt < max_retries - 1:
+            wait_time = 2 ** attempt
+            logger.info(f"Retrying in {wait_time} seconds...")
+            _record_retry(wait_time)
+            await asyncio.sleep(wait_time)
+
+    logger.error("Max retries reached for Ollama streaming call.")
+    raise RuntimeError("Ollama streaming request failed.")
+
+
+def query_ai_ollama(prompt: str, template_id: str) -> List[Dict[str, Any]]:
+    """Synchronous wrapper around query_ai_ollama_async."""
+    return run_sync(query_ai_ollama_async(prompt, template_id))
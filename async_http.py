@@ -0,0 +1,44 @@
+import asyncio
+import weakref
+from typing import Awaitable, Dict, TypeVar
+import aiohttp
+
+T = TypeVar("T")
+
+# Сессии aiohttp привязаны к event loop, поэтому храним их отдельно для каждого loop
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, aiohttp.ClientSession]]" = weakref.WeakKeyDictionary()
+
+
+def get_async_session(name: str, pool_size: int) -> aiohttp.ClientSession:
+    """
+    Returns the keep-alive session with the given name for the running event loop,
+    creating it on first use. Must be called from inside a coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    sessions = _sessions.setdefault(loop, {})
+    session = sessions.get(name)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size))
+        sessions[name] = session
+    return session
+
+
+async def close_async_sessions():
+    """Closes every session opened on the running event loop."""
+    sessions = _sessions.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+def run_sync(awaitable: Awaitable[T]) -> T:
+    """
+    Runs a coroutine to completion on a fresh event loop and closes the
+    sessions it opened; the synchronous API is a thin wrapper over this.
+    """
+    async def run() -> T:
+        try:
+            return await awaitable
+        finally:
+            await close_async_sessions()
+
+    return asyncio.run(run())
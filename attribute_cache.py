@@ -0,0 +1,112 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from config import logger
+
+
+class TemplateAttributeCache:
+    """
+    Кэш результатов ListAllProperties по шаблонам с TTL и LRU-вытеснением.
+    После успешного CreateProperty запись дополняется локально, без повторного запроса.
+    TTL отсчитывается от последней полной загрузки. Если задан db_path,
+    записи дублируются в sqlite (строка на атрибут, чтобы созданный атрибут
+    дописывался одной вставкой) и переживают перезапуск процесса.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_templates: int = 128, db_path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_templates = max_templates
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            # Прежний формат (весь список одной строкой) — это кэш, его можно просто сбросить
+            self._db.execute("DROP TABLE IF EXISTS template_attributes")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cached_templates (template_id TEXT PRIMARY KEY, fetched_at REAL NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cached_attributes (template_id TEXT NOT NULL, data TEXT NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS cached_attributes_template ON cached_attributes (template_id)")
+            self._db.commit()
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at < self.ttl_seconds
+
+    def _remember(self, template_id: str, fetched_at: float, attributes: List[Dict[str, Any]]):
+        self._entries[template_id] = (fetched_at, attributes)
+        self._entries.move_to_end(template_id)
+        while len(self._entries) > self.max_templates:
+            evicted, _ = self._entries.popitem(last=False)
+            logger.debug(f"Attribute cache: evicted template {evicted}")
+
+    def _delete_rows(self, template_id: str):
+        self._db.execute("DELETE FROM cached_templates WHERE template_id = ?", (template_id,))
+        self._db.execute("DELETE FROM cached_attributes WHERE template_id = ?", (template_id,))
+
+    def _load(self, template_id: str) -> Optional[Tuple[float, List[Dict[str, Any]]]]:
+        entry = self._entries.get(template_id)
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT fetched_at FROM cached_templates WHERE template_id = ?", (template_id,)
+            ).fetchone()
+            if row is not None:
+                rows = self._db.execute(
+                    "SELECT data FROM cached_attributes WHERE template_id = ? ORDER BY rowid", (template_id,)
+                ).fetchall()
+                entry = (row[0], [json.loads(data) for data, in rows])
+                self._remember(template_id, *entry)
+        return entry
+
+    def get(self, template_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Returns a copy of the cached attributes, or None if missing or stale."""
+        with self._lock:
+            entry = self._load(template_id)
+            if entry is None:
+                return None
+            fetched_at, attributes = entry
+            if not self._is_fresh(fetched_at):
+                logger.debug(f"Attribute cache: entry for {template_id} is stale")
+                self._entries.pop(template_id, None)
+                return None
+            self._entries.move_to_end(template_id)
+            return list(attributes)
+
+    def put(self, template_id: str, attributes: List[Dict[str, Any]]):
+        """Stores the result of a full ListAllProperties fetch."""
+        fetched_at = time.time()
+        attributes = list(attributes)
+        with self._lock:
+            self._remember(template_id, fetched_at, attributes)
+            if self._db is not None:
+                self._delete_rows(template_id)
+                self._db.execute("INSERT INTO cached_templates (template_id, fetched_at) VALUES (?, ?)", (template_id, fetched_at))
+                self._db.executemany(
+                    "INSERT INTO cached_attributes (template_id, data) VALUES (?, ?)",
+                    ((template_id, json.dumps(attr, ensure_ascii=False)) for attr in attributes)
+                )
+                self._db.commit()
+
+    def record_created(self, template_id: str, attribute_json: Dict[str, Any]):
+        """Appends an attribute we have just created to a fresh cached entry (one row in sqlite)."""
+        with self._lock:
+            entry = self._load(template_id)
+            if entry is None or not self._is_fresh(entry[0]):
+                return
+            entry[1].append(attribute_json)
+            self._entries.move_to_end(template_id)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO cached_attributes (template_id, data) VALUES (?, ?)",
+                    (template_id, json.dumps(attribute_json, ensure_ascii=False))
+                )
+                self._db.commit()
+
+    def invalidate(self, template_id: str):
+        """Drops the entry so the next read does a full fetch (e.g. after a conflict)."""
+        with self._lock:
+            self._entries.pop(template_id, None)
+            if self._db is not None:
+                self._delete_rows(template_id)
+                self._db.commit()
@@ -0,0 +1,93 @@
+from typing import Any, Dict, Tuple
+from config import logger
+
+# Типы Platform API, которые мы создаём, и допустимые значения Format для каждого
+ATTRIBUTE_FORMATS: Dict[str, Tuple[str, ...]] = {
+    "String": ("PlainText",),
+    "DateTime": ("DateISO",),
+    "Decimal": (),
+}
+MAX_DECIMAL_PLACES = 10
+REQUIRED_KEYS = ('containerId', 'alias', 'type', 'attributes')
+
+# Скомпилированные таблицы для проверки: тип без учёта регистра -> канонический тип
+_TYPES_BY_KEY = {type_name.lower(): type_name for type_name in ATTRIBUTE_FORMATS}
+_FORMATS_BY_KEY = {
+    type_name: {fmt.lower(): fmt for fmt in formats} for type_name, formats in ATTRIBUTE_FORMATS.items()
+}
+
+_ATTRIBUTE_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "containerId": {"type": "string"},
+        "alias": {"type": "string"},
+        "type": {"type": "string", "enum": list(ATTRIBUTE_FORMATS)},
+        "attributes": {
+            "type": "object",
+            "properties": {
+                "ObjectApp": {"type": "string"},
+                "Name": {"type": "string"},
+                "Format": {"type": "string", "enum": sorted({fmt for formats in ATTRIBUTE_FORMATS.values() for fmt in formats})},
+                "DecimalPlaces": {"type": "integer", "minimum": 0, "maximum": MAX_DECIMAL_PLACES},
+            },
+            "required": ["Name"],
+        },
+    },
+    "required": list(REQUIRED_KEYS),
+}
+
+# JSON Schema для структурированного вывода Ollama (format); массив обёрнут в объект
+CREATE_PROPERTY_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {"attributes": {"type": "array", "items": _ATTRIBUTE_ITEM_SCHEMA}},
+    "required": ["attributes"],
+}
+
+
+def _schema_error(item: Dict[str, Any]) -> str:
+    """
+    Checks an item against the CreateProperty schema and normalizes it in place
+    (type and Format case, numeric DecimalPlaces). Returns the error or "".
+    """
+    missing = [key for key in REQUIRED_KEYS if key not in item]
+    if missing:
+        return f"missing keys {missing}"
+    if not isinstance(item['alias'], str) or not item['alias'].strip():
+        return "alias is not a non-empty string"
+    attributes = item['attributes']
+    if not isinstance(attributes, dict):
+        return "'attributes' is not a dict"
+
+    type_name = _TYPES_BY_KEY.get(str(item['type']).lower())
+    if type_name is None:
+        return f"unsupported type {item['type']!r}"
+    item['type'] = type_name
+
+    if 'Format' in attributes:
+        fmt = _FORMATS_BY_KEY[type_name].get(str(attributes['Format']).lower())
+        if fmt is None:
+            return f"Format {attributes['Format']!r} is not valid for {type_name}"
+        attributes['Format'] = fmt
+
+    if 'DecimalPlaces' in attributes:
+        if type_name != "Decimal":
+            return f"DecimalPlaces is only valid for Decimal, not {type_name}"
+        places = attributes['DecimalPlaces']
+        if isinstance(places, str) and places.strip().isdigit():
+            places = int(places)
+        if isinstance(places, bool) or not isinstance(places, int) or not 0 <= places <= MAX_DECIMAL_PLACES:
+            return f"DecimalPlaces {attributes['DecimalPlaces']!r} is not an integer in [0, {MAX_DECIMAL_PLACES}]"
+        attributes['DecimalPlaces'] = places
+    return ""
+
+
+def validate_attribute_item(item: Any) -> bool:
+    """Validates a generated CreateProperty item (normalizing it in place) and logs why it is rejected."""
+    if not isinstance(item, dict):
+        logger.warning(f"Skipping non-dict item in list: {item}")
+        return False
+    error = _schema_error(item)
+    if error:
+        logger.warning(f"Skipping item that does not match the CreateProperty schema ({error}): {item}")
+        return False
+    return True
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import pathlib
+from typing import List, Dict, Any, Optional
+from config import BATCH_MAX_PARALLEL, XML_MAX_SAMPLES, logger
+from async_http import run_sync
+from orchestrator import process_creation_request_async, write_metrics_report
+from xml_parser import parse_xml_schema
+
+REQUIRED_JOB_KEYS = ("request_text", "template_id", "template_name")
+
+
+def _resolve_job(job: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    """
+    Validates a job spec and sets 'xml_source': the inline 'xml' text or the
+    'xml_path' file (relative to the spec), which is streamed later, not read here.
+    """
+    missing = [key for key in REQUIRED_JOB_KEYS if not job.get(key)]
+    if missing:
+        raise ValueError(f"Batch job is missing required keys {missing}: {job}")
+    if "xml" in job:
+        return dict(job, xml_source=job["xml"])
+    if "xml_path" not in job:
+        raise ValueError(f"Batch job has neither 'xml' nor 'xml_path': {job}")
+    xml_path = os.path.join(base_dir, job["xml_path"])
+    if not os.path.isfile(xml_path):
+        raise ValueError(f"XML file not found: {xml_path}")
+    return dict(job, xml_source=pathlib.Path(xml_path))
+
+
+def _skip(skipped: Optional[List[str]], location: str, job: Any, error: Exception):
+    """Logs a job that cannot run and records it by template id (or by its location if it has none)."""
+    logger.error(f"Skipping job at {location}: {error}")
+    if skipped is not None:
+        template_id = job.get("template_id") if isinstance(job, dict) else None
+        skipped.append(str(template_id) if template_id else location)
+
+
+def _read_jsonl(path: str, skipped: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    jobs = []
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            job = None
+            try:
+                job = json.loads(line)
+                jobs.append(_resolve_job(job, base_dir))
+            except (json.JSONDecodeError, ValueError, OSError) as e:
+                _skip(skipped, f"{path}:{line_no}", job, e)
+    return jobs
+
+
+def load_jobs(path: str, skipped: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Loads batch jobs from a JSONL manifest or from a directory.
+    In a directory every *.json file holds one job and every *.jsonl file holds many.
+    A job has request_text, template_id, template_name and either xml or xml_path.
+    Jobs that cannot be loaded are logged and, if skipped is given, appended to it
+    by template id (or by file and line when the job has none).
+    """
+    if not os.path.isdir(path):
+        return _read_jsonl(path, skipped)
+
+    jobs = []
+    for name in sorted(os.listdir(path)):
+        full_path = os.path.join(path, name)
+        if name.endswith(".jsonl"):
+            jobs.extend(_read_jsonl(full_path, skipped))
+        elif name.endswith(".json"):
+            job = None
+            try:
+                with open(full_path, encoding="utf-8") as f:
+                    job = json.load(f)
+                jobs.append(_resolve_job(job, path))
+            except (json.JSONDecodeError, ValueError, OSError) as e:
+                _skip(skipped, full_path, job, e)
+    return jobs
+
+
+def merge_jobs(jobs: List[Dict[str, Any]], skipped: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Merges jobs that target the same template: their XML field sets and sample
+    values are unioned (bounded per field) and their request texts are joined,
+    so every template gets a single planning pass. Jobs with invalid XML are
+    left out and, if skipped is given, appended to it by template id.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for job in jobs:
+        try:
+            schema = parse_xml_schema(job["xml_source"])
+        except ValueError as e:
+            _skip(skipped, f"template {job['template_id']}", job, e)
+            continue
+
+        group = merged.setdefault(job["template_id"], {
+            "template_id": job["template_id"],
+            "template_name": job["template_name"],
+            "request_texts": [],
+            "field_samples": {},
+            "job_count": 0,
+        })
+        group["job_count"] += 1
+        if job["request_text"] not in group["request_texts"]:
+            group["request_texts"].append(job["request_text"])
+        for name, values in schema.items():
+            samples = group["field_samples"].setdefault(name, [])
+            for value in values:
+                if len(samples) < XML_MAX_SAMPLES and value not in samples:
+                    samples.append(value)
+    return list(merged.values())
+
+
+async def _run_group(group: Dict[str, Any], slots: asyncio.Semaphore) -> bool:
+    logger.info(f"Batch: template {group['template_id']} — {group['job_count']} job(s), {len(group['field_samples'])} field(s).")
+    try:
+        await process_creation_request_async(
+            "\n".join(group["request_texts"]),
+            None,
+            group["template_id"],
+            group["template_name"],
+            field_samples=group["field_samples"],
+            slot=slots,
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Batch: template {group['template_id']} failed: {e}")
+        return False
+
+
+async def run_batch_async(path: str, max_parallel: int = BATCH_MAX_PARALLEL) -> Dict[str, bool]:
+    """
+    Runs all jobs from a manifest or directory on the running event loop. Up to
+    max_parallel templates are processed concurrently; they share the loop's
+    HTTP sessions, adaptive rate limiter and submission stage.
+    Returns the success flag per template id. Skipped jobs count as failed: under
+    their template id, or under their file and line if they have none.
+    """
+    skipped: List[str] = []
+    groups = merge_jobs(load_jobs(path, skipped), skipped)
+    logger.info(f"Batch: {len(groups)} template(s) to process with up to {max_parallel} in parallel.")
+    slots = asyncio.Semaphore(max(1, max_parallel))
+    results = await asyncio.gather(*(_run_group(group, slots) for group in groups))
+    summary = {group["template_id"]: ok for group, ok in zip(groups, results)}
+    for key in skipped:
+        summary[key] = False
+    logger.info(f"Batch finished: {sum(summary.values())}/{len(summary)} template(s) succeeded, {len(skipped)} job(s) skipped.")
+    return summary
+
+
+def run_batch(path: str, max_parallel: int = BATCH_MAX_PARALLEL) -> Dict[str, bool]:
+    """Synchronous wrapper around run_batch_async."""
+    try:
+        return run_sync(run_batch_async(path, max_parallel))
+    finally:
+        write_metrics_report()
@@ -0,0 +1,173 @@
+"""
+Offline benchmark suite: python -m benchmarks.run [--json report.json]
+
+Starts local Platform API and Ollama stand-ins, points the configuration at
+them and reports throughput, p50/p99 latency and peak memory for
+parse_xml_fields, build_ai_prompt and process_creation_request, plus the
+cold-start time of fresh CLI processes.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Any, Callable
+
+from benchmarks.stubs import PlatformStub, OllamaStub
+from benchmarks.synthetic import generate_xml, write_xml
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _measure(name: str, size: int, repeats: int, func: Callable[[int], Any]) -> Dict[str, Any]:
+    """Runs func(run_index) `repeats` times for timing, then once more under tracemalloc."""
+    durations = []
+    for run_index in range(repeats):
+        started = time.perf_counter()
+        func(run_index)
+        durations.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        func(repeats)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50 = _percentile(durations, 0.5)
+    return {
+        "benchmark": name,
+        "fields": size,
+        "runs": repeats,
+        "p50_ms": round(p50 * 1000, 3),
+        "p99_ms": round(_percentile(durations, 0.99) * 1000, 3),
+        "fields_per_second": round(size / p50, 1) if p50 else None,
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def _measure_cold_start(name: str, argv: List[str], repeats: int, fields: int) -> Dict[str, Any]:
+    """Times fresh interpreter processes running argv from the repository root."""
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + argv, cwd=_REPO_ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - started)
+    return {
+        "benchmark": name,
+        "fields": fields,
+        "runs": repeats,
+        "p50_ms": round(_percentile(durations, 0.5) * 1000, 3),
+        "p99_ms": round(_percentile(durations, 0.99) * 1000, 3),
+        "fields_per_second": None,
+        "peak_memory_kb": None,
+    }
+
+
+def _cold_start_results(repeats: int) -> List[Dict[str, Any]]:
+    fields = 100
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = os.path.join(tmp, "cold_start.xml")
+        write_xml(xml_path, fields)
+        return [
+            _measure_cold_start("cold_start:cli --help", ["-m", "cli", "--help"], repeats, 0),
+            _measure_cold_start("cold_start:cli parse", ["-m", "cli", "-q", "parse", xml_path], repeats, fields),
+            _measure_cold_start("cold_start:import orchestrator", ["-c", "import orchestrator"], repeats, 0),
+        ]
+
+
+def _print_table(results: List[Dict[str, Any]]):
+    columns = ("benchmark", "fields", "runs", "p50_ms", "p99_ms", "fields_per_second", "peak_memory_kb")
+    widths = {column: max(len(column), *(len(str(row[column])) for row in results)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in results:
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000,100000", help="field counts for parse/prompt benchmarks")
+    parser.add_argument("--e2e-sizes", default="10,100", help="field counts for process_creation_request")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--platform-latency", type=float, default=0.005, help="seconds per Platform API request")
+    parser.add_argument("--ollama-delay", type=float, default=0.05, help="seconds per Ollama request")
+    parser.add_argument("--conflict-rate", type=float, default=0.0, help="share of 409 responses")
+    parser.add_argument("--exists-rate", type=float, default=0.0, help="share of 'уже существует' 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of rate-limit 500 responses")
+    parser.add_argument("--stream", action="store_true", help="use the streaming Ollama client")
+    parser.add_argument("--cold-start-repeats", type=int, default=5, help="fresh processes per cold-start benchmark (0 to skip)")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    # Холодный старт меряется до того, как окружение перенастроено на заглушки
+    results = _cold_start_results(args.cold_start_repeats) if args.cold_start_repeats > 0 else []
+
+    platform = PlatformStub(latency=args.platform_latency, conflict_rate=args.conflict_rate,
+                            exists_rate=args.exists_rate, rate_limit_rate=args.rate_limit_rate).start()
+    ollama = OllamaStub(delay=args.ollama_delay).start()
+
+    # Конфигурация читается при импорте, поэтому окружение задаётся до импорта модулей проекта
+    os.environ.update({
+        "PLATFORM_API_BASE_URL": platform.url,
+        "OLLAMA_API_URL": f"{ollama.url}/api/generate",
+        "OLLAMA_STREAM": "true" if args.stream else "false",
+        "AI_CACHE_DIR": "",
+        "ATTRIBUTE_CACHE_PATH": "",
+        "METRICS_REPORT_PATH": "",
+    })
+    from config import configure_logging
+    from orchestrator import process_creation_request
+    from xml_parser import parse_xml_fields, build_ai_prompt
+
+    configure_logging(logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    e2e_sizes = [int(size) for size in args.e2e_sizes.split(",") if size]
+
+    try:
+        for size in sizes:
+            xml = generate_xml(size)
+            repeats = args.repeats if size <= 10000 else max(1, args.repeats // 5)
+            results.append(_measure("parse_xml_fields", size, repeats, lambda _: parse_xml_fields(xml)))
+
+            fields = parse_xml_fields(xml)
+            existing = [
+                {"alias": f"EXISTING{index}", "type": "String", "attributes": {"Name": f"EXISTING{index}"}}
+                for index in range(size // 2)
+            ]
+            template_info = {"id": "oa.bench", "name": "Benchmark"}
+            results.append(_measure("build_ai_prompt", size, repeats, lambda _: build_ai_prompt(
+                "Benchmark request", fields, template_info, existing, "Instruction manual"
+            )))
+
+        for size in e2e_sizes:
+            xml = generate_xml(size)
+            # Каждый прогон — в свой шаблон, чтобы кэш атрибутов не влиял на результат
+            results.append(_measure("process_creation_request", size, args.repeats, lambda run_index: process_creation_request(
+                "Benchmark request", xml, f"oa.bench{size}.{run_index}", "Benchmark"
+            )))
+    finally:
+        platform.stop()
+        ollama.stop()
+
+    _print_table(results)
+    print(f"\nCreateProperty calls: {platform.create_calls}, Ollama calls: {ollama.calls}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Local stand-ins for the Platform API and Ollama used by the benchmark suite.
+Both run on stdlib ThreadingHTTPServer in a background thread.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional
+
+_XML_FIELDS_RE = re.compile(r"<xml_fields_data>\n(.*?)\n</xml_fields_data>", re.S)
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиенты закрывают поток, как только разобрали ответ, — это не ошибка
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _StubServer:
+    """Runs a request handler bound to this stub on a free local port."""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        stub = self
+
+        class Handler(self.handler_class):
+            protocol_version = "HTTP/1.1"
+            server_stub = stub
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _QuietServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _send_json(handler: BaseHTTPRequestHandler, status: int, data: Any):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def _read_body(handler: BaseHTTPRequestHandler) -> bytes:
+    return handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+
+
+class _PlatformHandler(BaseHTTPRequestHandler):
+    server_stub: "PlatformStub"
+
+    def do_POST(self):
+        stub = self.server_stub
+        body = _read_body(self)
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        if self.path.endswith("/ListAllProperties"):
+            with stub.lock:
+                attributes = list(stub.attributes.get(body.decode("utf-8"), {}).values())
+            _send_json(self, 200, attributes)
+        elif self.path.endswith("/CreateProperty"):
+            _send_json(self, *stub.create(json.loads(body)))
+        elif self.path.endswith("/creation_complete"):
+            _send_json(self, 200, {})
+        else:
+            _send_json(self, 404, {"error": "not found"})
+
+
+class PlatformStub(_StubServer):
+    """
+    Platform API stand-in: ListAllProperties, CreateProperty and creation_complete.
+    Latency and the share of 409, 'уже существует' 500 and rate-limit 500 responses
+    are configurable.
+    """
+
+    handler_class = _PlatformHandler
+
+    def __init__(self, latency: float = 0.0, conflict_rate: float = 0.0, exists_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.conflict_rate = conflict_rate
+        self.exists_rate = exists_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.attributes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.create_calls = 0
+        self.lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def create(self, attribute_json: Dict[str, Any]):
+        with self.lock:
+            self.create_calls += 1
+            roll = self._rng.random()
+            container = self.attributes.setdefault(attribute_json.get("containerId", ""), {})
+            if roll < self.rate_limit_rate:
+                return 500, {"alias": "Запросы отправляются слишком часто"}
+            roll -= self.rate_limit_rate
+            if attribute_json["alias"] in container or roll < self.exists_rate:
+                return 500, {"alias": f"Атрибут {attribute_json['alias']} уже существует"}
+            roll -= self.exists_rate
+            if roll < self.conflict_rate:
+                return 409, {"error": "conflict"}
+            container[attribute_json["alias"]] = attribute_json
+            return 200, {}
+
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    server_stub: "OllamaStub"
+
+    def do_POST(self):
+        stub = self.server_stub
+        request = json.loads(_read_body(self))
+        text = stub.next_response(request.get("prompt", ""))
+        usage = {"prompt_eval_count": len(request.get("prompt", "")) // 4, "eval_count": len(text) // 4}
+        if stub.delay:
+            time.sleep(stub.delay)
+
+        if not request.get("stream"):
+            _send_json(self, 200, dict(usage, response=text, done=True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        try:
+            for start in range(0, len(text), stub.stream_chunk_chars):
+                event = {"response": text[start:start + stub.stream_chunk_chars], "done": False}
+                write_chunk((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            write_chunk((json.dumps(dict(usage, response="", done=True)) + "\n").encode("utf-8"))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент закрыл поток, как только массив был разобран
+            pass
+
+
+class OllamaStub(_StubServer):
+    """
+    Ollama /api/generate stand-in. Replays canned responses in order (cycling),
+    or, without canned responses, answers with CreateProperty definitions for the
+    first `batch_size` fields listed in the prompt's xml_fields_data.
+    """
+
+    handler_class = _OllamaHandler
+
+    def __init__(self, responses: Optional[List[str]] = None, delay: float = 0.0, batch_size: int = 5,
+                 stream_chunk_chars: int = 16):
+        super().__init__()
+        self.responses = responses or []
+        self.delay = delay
+        self.batch_size = batch_size
+        self.stream_chunk_chars = stream_chunk_chars
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def next_response(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            if self.responses:
+                return self.responses[(self.calls - 1) % len(self.responses)]
+        match = _XML_FIELDS_RE.search(prompt)
+        fields = json.loads(match.group(1)) if match else []
+        items = [
+            {
+                "containerId": "oa.0",
+                "alias": field["name"],
+                "type": "Decimal",
+                "attributes": {"ObjectApp": "sln.2", "Name": field["name"], "DecimalPlaces": 0},
+            }
+            for field in fields[:self.batch_size]
+        ]
+        return json.dumps(items, ensure_ascii=False)
@@ -0,0 +1,39 @@
+"""Synthetic XML documents shaped like our SAP exports."""
+import random
+from typing import Iterator
+
+# Генераторы значений, похожих на реальные поля выгрузок
+_VALUE_KINDS = (
+    lambda rng: f"{rng.randrange(10 ** 24):025d}",                       # SAPCODE
+    lambda rng: f"{rng.randint(2000, 2030)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00.000000000",
+    lambda rng: f"{rng.uniform(0, 10 ** 10):.2f}",                        # суммы
+    lambda rng: str(rng.randint(0, 100)),                                 # неоднозначные целые
+    lambda rng: rng.choice(("RUB", "USD", "EUR", "S2", "syasya")),
+    lambda rng: f"{rng.randint(0, 99):02d}",                              # коды с ведущим нулём
+)
+
+
+def _iter_xml(field_count: int, record_count: int, seed: int) -> Iterator[str]:
+    rng = random.Random(seed)
+    kinds = [rng.randrange(len(_VALUE_KINDS)) for _ in range(field_count)]
+    yield "<root>"
+    for _ in range(record_count):
+        if record_count > 1:
+            yield "<record>"
+        for index, kind in enumerate(kinds):
+            yield f"<FIELD{index}>{_VALUE_KINDS[kind](rng)}</FIELD{index}>"
+        if record_count > 1:
+            yield "</record>"
+    yield "</root>"
+
+
+def generate_xml(field_count: int, record_count: int = 1, seed: int = 0) -> str:
+    """Returns an XML document with field_count fields repeated in record_count records."""
+    return "".join(_iter_xml(field_count, record_count, seed))
+
+
+def write_xml(path: str, field_count: int, record_count: int = 1, seed: int = 0):
+    """Writes the document straight to disk without building it in memory."""
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in _iter_xml(field_count, record_count, seed):
+            f.write(chunk)
@@ -0,0 +1,198 @@
+"""
+Command-line interface: python -m cli <command> ...
+
+  parse           print the XML schema (field -> sample values)
+  plan            show which fields are covered, the closest existing attribute
+                  of the rest, and which are inferred locally or left for the model
+  preview-prompt  print the prompts that would be sent to the model
+  run             run the full creation process for one template
+  batch           process a JSONL manifest or a directory of jobs
+  serve           start the HTTP service
+  settings        print the effective configuration
+
+The network client (aiohttp) is imported only by the commands that
+need it, so parse / plan --existing / preview-prompt --existing start fast.
+"""
+import argparse
+import json
+import logging
+import pathlib
+import sys
+from typing import List, Dict, Any, Optional
+import config
+from config import configure_logging
+
+
+def _xml_source(path: str):
+    return sys.stdin.buffer if path == "-" else pathlib.Path(path)
+
+
+def _print_json(data: Any):
+    json.dump(data, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+
+def _existing_attributes(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Existing attributes from --existing (a saved ListAllProperties response) or from the Platform API."""
+    if args.existing:
+        with open(args.existing, encoding="utf-8") as f:
+            return json.load(f)
+    from platform_api import get_existing_attributes
+    return get_existing_attributes(args.template)
+
+
+def _suggestions(missing: Dict[str, str], index: Any) -> Dict[str, Dict[str, Any]]:
+    """The closest existing attribute for every field left to create, for a human to double-check."""
+    suggestions = {}
+    for name in missing:
+        match = index.best_match(name)
+        if match is not None:
+            described, score = match
+            suggestions[name] = dict(described, score=round(score, 2))
+    return suggestions
+
+
+def _plan(args: argparse.Namespace) -> Dict[str, Any]:
+    from matching import AttributeMatchIndex
+    from planner import plan_missing_fields, chunk_fields
+    from type_inference import infer_attributes
+    from xml_parser import parse_xml_schema, representative_values
+
+    field_samples = parse_xml_schema(_xml_source(args.xml))
+    xml_fields = representative_values(field_samples)
+    index = AttributeMatchIndex(_existing_attributes(args))
+    missing = plan_missing_fields(xml_fields, index)
+    local, ambiguous = infer_attributes({name: field_samples[name] for name in missing}, args.template)
+    return {
+        "xml_fields": xml_fields,
+        "index": index,
+        "covered": [name for name in xml_fields if name not in missing],
+        "suggestions": _suggestions(missing, index),
+        "local": local,
+        "chunks": chunk_fields({name: xml_fields[name] for name in ambiguous}, args.chunk_size),
+    }
+
+
+def cmd_parse(args: argparse.Namespace) -> int:
+    from xml_parser import parse_xml_schema
+    _print_json(parse_xml_schema(_xml_source(args.xml), max_samples=args.samples))
+    return 0
+
+
+def cmd_plan(args: argparse.Namespace) -> int:
+    plan = _plan(args)
+    _print_json({
+        "covered": plan["covered"],
+        "suggestions": plan["suggestions"],
+        "local": plan["local"],
+        "chunks": [list(chunk) for chunk in plan["chunks"]],
+    })
+    return 0
+
+
+def cmd_preview_prompt(args: argparse.Namespace) -> int:
+    from xml_parser import INSTRUCTION_MANUAL, build_ai_prompt, estimate_tokens
+    plan = _plan(args)
+    template_info = {"id": args.template, "name": args.name}
+    existing = plan["index"]
+    for attr_json in plan["local"]:
+        existing.add(attr_json)
+    for index, chunk in enumerate(plan["chunks"], 1):
+        prompt = build_ai_prompt(args.request, chunk, template_info, existing, INSTRUCTION_MANUAL,
+                                 max_attributes=args.chunk_size)
+        print(f"===== chunk {index}/{len(plan['chunks'])}: {len(chunk)} field(s), ~{estimate_tokens(prompt)} tokens =====")
+        print(prompt)
+    if not plan["chunks"]:
+        print("No fields left for the model.", file=sys.stderr)
+    return 0
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    from orchestrator import process_creation_request
+    try:
+        run_id = process_creation_request(args.request, _xml_source(args.xml), args.template, args.name,
+                                          run_id=args.run_id, resume=args.resume)
+    except Exception as e:
+        print(f"Run failed: {e}", file=sys.stderr)
+        return 1
+    print(run_id)
+    return 0
+
+
+def cmd_batch(args: argparse.Namespace) -> int:
+    from batch import run_batch
+    summary = run_batch(args.path, args.max_parallel)
+    return 0 if all(summary.values()) else 1
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    from server import serve
+    serve(args.host, args.port)
+    return 0
+
+
+def cmd_settings(args: argparse.Namespace) -> int:
+    _print_json(config.settings_dict())
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-v", "--verbose", action="store_true", help="debug logging")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only warnings and errors")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    def xml_command(name: str, help_text: str, handler) -> argparse.ArgumentParser:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("xml", help="XML file, or - for stdin")
+        command.set_defaults(handler=handler)
+        return command
+
+    def planning_options(command: argparse.ArgumentParser):
+        command.add_argument("--template", required=True, help="template (container) id, e.g. oa.25")
+        command.add_argument("--existing", help="JSON file with existing attributes instead of calling the Platform API")
+        command.add_argument("--chunk-size", type=int, default=config.AI_CHUNK_SIZE)
+
+    command = xml_command("parse", "print the XML schema", cmd_parse)
+    command.add_argument("--samples", type=int, default=config.XML_MAX_SAMPLES, help="sample values per field")
+
+    planning_options(xml_command("plan", "show the creation plan", cmd_plan))
+
+    command = xml_command("preview-prompt", "print the model prompts", cmd_preview_prompt)
+    planning_options(command)
+    command.add_argument("--name", default="", help="template name")
+    command.add_argument("--request", default="", help="user request text")
+
+    command = xml_command("run", "create the attributes", cmd_run)
+    command.add_argument("--template", required=True)
+    command.add_argument("--name", required=True, help="template name")
+    command.add_argument("--request", required=True, help="user request text")
+    command.add_argument("--run-id", help="journal run id (JOURNAL_DIR)")
+    command.add_argument("--resume", action="store_true", help="resume the journaled run --run-id")
+
+    command = commands.add_parser("batch", help="process a manifest or a directory of jobs")
+    command.add_argument("path")
+    command.add_argument("--max-parallel", type=int, default=config.BATCH_MAX_PARALLEL)
+    command.set_defaults(handler=cmd_batch)
+
+    command = commands.add_parser("serve", help="start the HTTP service")
+    command.add_argument("--host", default=config.SERVER_HOST)
+    command.add_argument("--port", type=int, default=config.SERVER_PORT)
+    command.set_defaults(handler=cmd_serve)
+
+    commands.add_parser("settings", help="print the effective configuration").set_defaults(handler=cmd_settings)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "run" and args.resume and not args.run_id:
+        print("--resume requires --run-id", file=sys.stderr)
+        return 2
+    configure_logging(logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
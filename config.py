@@ -1,5 +1,6 @@
 import logging
 import os
+from typing import Dict, Any
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения из .env (если есть)
@@ -10,8 +11,89 @@ PLATFORM_API_BASE_URL = os.getenv("PLATFORM_API_BASE_URL", "http://10.9.0.160:90
 PLATFORM_API_TOKEN = os.getenv("PLATFORM_API_TOKEN", "YW1vbDpDMG0xbmR3NHIzUGxAdGYwcm0=")
 OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5-coder:32b")
+# Потоковый режим: атрибуты отправляются в Platform API по мере генерации
+OLLAMA_STREAM = os.getenv("OLLAMA_STREAM", "false").lower() in ("1", "true", "yes")
+# Ограничение формата ответа Ollama: "" — без ограничения, "json" — любой JSON, "schema" — JSON Schema CreateProperty
+OLLAMA_FORMAT = os.getenv("OLLAMA_FORMAT", "").lower()
+# Пул бэкендов Ollama: "url|model,url|model" (модель необязательна); пусто — только OLLAMA_API_URL
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")
+# Через сколько секунд дублировать медленный запрос на второй бэкенд (0 — не дублировать)
+OLLAMA_HEDGE_AFTER = float(os.getenv("OLLAMA_HEDGE_AFTER", "90"))
+# Circuit breaker: число ошибок подряд и время отключения хоста в секундах
+OLLAMA_CIRCUIT_FAILURES = int(os.getenv("OLLAMA_CIRCUIT_FAILURES", "3"))
+OLLAMA_CIRCUIT_COOLDOWN = float(os.getenv("OLLAMA_CIRCUIT_COOLDOWN", "30"))
+# Размер контекста и время удержания модели в памяти между запросами
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Сколько токенов контекста оставить под ответ модели
+PROMPT_RESPONSE_RESERVE_TOKENS = int(os.getenv("PROMPT_RESPONSE_RESERVE_TOKENS", "2048"))
+
+# Параллельное создание атрибутов (CreateProperty)
+PLATFORM_MAX_WORKERS = int(os.getenv("PLATFORM_MAX_WORKERS", "8"))
+PLATFORM_MIN_WORKERS = int(os.getenv("PLATFORM_MIN_WORKERS", "1"))
+PLATFORM_POOL_SIZE = int(os.getenv("PLATFORM_POOL_SIZE", "16"))
+
+# Минимальная уверенность локального определения типа; остальные поля уходят в LLM
+TYPE_INFERENCE_MIN_CONFIDENCE = float(os.getenv("TYPE_INFERENCE_MIN_CONFIDENCE", "0.8"))
+
+# Кэш ListAllProperties: TTL в секундах, число шаблонов, путь к sqlite (пусто — только память)
+ATTRIBUTE_CACHE_TTL = float(os.getenv("ATTRIBUTE_CACHE_TTL", "300"))
+ATTRIBUTE_CACHE_MAX_TEMPLATES = int(os.getenv("ATTRIBUTE_CACHE_MAX_TEMPLATES", "128"))
+ATTRIBUTE_CACHE_PATH = os.getenv("ATTRIBUTE_CACHE_PATH", "")
+
+# Кэш ответов модели на диске (пусто — отключён) и его предельный размер в байтах
+AI_CACHE_DIR = os.getenv("AI_CACHE_DIR", "")
+AI_CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Пакетный режим: сколько шаблонов обрабатывается одновременно
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+# Сколько неоднозначных полей отправлять модели в одном запросе и сколько таких запросов выполнять одновременно
+AI_CHUNK_SIZE = int(os.getenv("AI_CHUNK_SIZE", "5"))
+AI_MAX_PARALLEL_CHUNKS = int(os.getenv("AI_MAX_PARALLEL_CHUNKS", "4"))
+# Сколько раз спрашивать модель об одном поле, если её ответ так и не покрыл его
+AI_FIELD_MAX_ATTEMPTS = int(os.getenv("AI_FIELD_MAX_ATTEMPTS", "3"))
+
+# Сопоставление полей XML с существующими атрибутами: сколько похожих атрибутов на поле брать в промпт,
+# минимальная похожесть и необязательная модель эмбеддингов sentence-transformers (пусто — только триграммы)
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "5"))
+MATCH_MIN_SCORE = float(os.getenv("MATCH_MIN_SCORE", "0.3"))
+MATCH_EMBEDDING_MODEL = os.getenv("MATCH_EMBEDDING_MODEL", "")
+# Поле, настолько похожее на существующий атрибут, не создаётся локально: решение о дубликате принимает модель
+MATCH_DUPLICATE_SCORE = float(os.getenv("MATCH_DUPLICATE_SCORE", "0.95"))
+
+# Сколько примеров значений хранить для каждого поля XML
+XML_MAX_SAMPLES = int(os.getenv("XML_MAX_SAMPLES", "5"))
+
+# Каталог журналов запусков для возобновления после сбоя (пусто — журнал не ведётся)
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "")
+
+# Режим сервиса (server.py): адрес, число воркеров, длина очереди и сколько завершённых заданий помнить
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "4"))
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "100"))
+SERVER_JOB_HISTORY = int(os.getenv("SERVER_JOB_HISTORY", "1000"))
+
+# Отладочный вывод промптов и ответов модели в stdout (дорого для больших промптов)
+VERBOSE = os.getenv("PROXYAI_VERBOSE", "false").lower() in ("1", "true", "yes")
+# Куда записать JSON-отчёт с метриками после запуска (пусто — не записывать)
+METRICS_REPORT_PATH = os.getenv("METRICS_REPORT_PATH", "")
+
+# Не выводятся командой "python -m cli settings"
+_SECRET_SETTINGS = ("PLATFORM_API_TOKEN",)
+
+
+def settings_dict() -> Dict[str, Any]:
+    """The effective configuration (the upper-case constants above) without secrets."""
+    return {name: value for name, value in globals().items()
+            if name.isupper() and not name.startswith("_") and name not in _SECRET_SETTINGS}
+
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
-# logger.setLevel(logging.DEBUG)  # Раскомментировать для отладки
\ No newline at end of file
+
+
+def configure_logging(level: int = logging.INFO):
+    """Configures the root logger; called by entry points, not on import."""
+    logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(message)s')
+    # logger.setLevel(logging.DEBUG)  # Раскомментировать для отладки
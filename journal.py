@@ -0,0 +1,123 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+from config import logger
+
+_RUN_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+class JournalState:
+    """What a previous run managed to do, reconstructed from its journal."""
+
+    def __init__(self):
+        self.template_id: Optional[str] = None
+        self.field_samples: Optional[Dict[str, List[str]]] = None
+        self.model_outputs: Dict[str, Dict[str, Any]] = {}
+        self.created: set = set()
+        self.failed: set = set()
+        self.status: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status == "completed"
+
+    def outstanding(self) -> List[Dict[str, Any]]:
+        """Model outputs whose creation was not confirmed before the run stopped."""
+        return [item for alias, item in self.model_outputs.items() if alias not in self.created]
+
+    def apply(self, event: Dict[str, Any]):
+        kind = event.get("event")
+        if kind == "run_started":
+            self.template_id = event.get("template_id")
+            self.status = None
+        elif kind == "schema":
+            self.field_samples = event.get("field_samples")
+        elif kind == "model_output":
+            item = event.get("item") or {}
+            if item.get("alias"):
+                self.model_outputs[item["alias"]] = item
+        elif kind == "create_result":
+            alias = event.get("alias")
+            if event.get("created"):
+                self.created.add(alias)
+                self.failed.discard(alias)
+            else:
+                self.failed.add(alias)
+        elif kind == "run_finished":
+            self.status = event.get("status")
+
+
+class RunJournal:
+    """
+    Append-only JSONL write-ahead journal of one creation run. Each event is
+    flushed as soon as it happens, so a crashed run can be resumed from it.
+    """
+
+    def __init__(self, directory: str, run_id: str):
+        if not _RUN_ID_RE.match(run_id):
+            raise ValueError(f"Invalid run id: {run_id!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.run_id = run_id
+        self.path = os.path.join(directory, f"{run_id}.jsonl")
+        self._lock = threading.Lock()
+        self._file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def replay(self) -> JournalState:
+        """Reads the events written so far; a torn last line from a crash is ignored."""
+        state = JournalState()
+        if not os.path.exists(self.path):
+            return state
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    state.apply(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring unreadable journal line {line_number} in {self.path}.")
+        return state
+
+    def record(self, event: str, **data: Any):
+        line = json.dumps(dict(data, event=event, ts=time.time()), ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+
+class NullJournal:
+    """Stand-in used when journaling is disabled."""
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id
+
+    def exists(self) -> bool:
+        return False
+
+    def replay(self) -> JournalState:
+        return JournalState()
+
+    def record(self, event: str, **data: Any):
+        pass
+
+    def close(self):
+        pass
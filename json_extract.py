@@ -0,0 +1,140 @@
+import json
+from typing import List, Any, Dict, Tuple
+from config import logger
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a JSON array arriving in arbitrary text chunks.
+    Text before the opening bracket is ignored; every top-level element is
+    returned as soon as its closing bracket arrives. Only the element being
+    assembled is buffered, never the whole response. An empty array does not end
+    the scan: "[]" quoted in prose may be followed by the real answer.
+    """
+
+    def __init__(self):
+        self.in_array = False
+        self.done = False
+        self.elements_seen = 0
+        self.empty_array_seen = False
+        self.prose_seen = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer: List[str] = []
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consumes a chunk of text and returns the elements completed by it."""
+        completed = []
+        for ch in chunk:
+            if self.done:
+                break
+            if not self.in_array:
+                if ch == '[':
+                    self.in_array = True
+                elif not ch.isspace():
+                    self.prose_seen = True
+                continue
+
+            if self._depth == 0:
+                if ch in '{[':
+                    self._depth = 1
+                    self._buffer = [ch]
+                elif ch == ']':
+                    if self.elements_seen:
+                        self.done = True
+                    else:
+                        # Пустой массив — возможно, пример в тексте модели; ищем следующую '['
+                        self.in_array = False
+                        self.empty_array_seen = True
+                elif not (ch.isspace() or ch == ','):
+                    if self.elements_seen:
+                        # Массив уже начался, дальше мусор — прекращаем разбор
+                        logger.warning(f"Unexpected character {ch!r} inside JSON array, stopping parse.")
+                        self.done = True
+                    else:
+                        # Это была не JSON-скобка, а текст модели — ищем следующую '['
+                        self.in_array = False
+                        self.prose_seen = True
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    element_str = "".join(self._buffer)
+                    self._buffer = []
+                    self.elements_seen += 1
+                    try:
+                        completed.append(json.loads(element_str))
+                    except json.JSONDecodeError as je:
+                        logger.warning(f"Skipping malformed array element: {je}")
+        return completed
+
+    @property
+    def found_array(self) -> bool:
+        """True once an array has been opened, even if it turned out to be empty."""
+        return self.in_array or self.elements_seen > 0 or self.empty_array_seen
+
+    @property
+    def complete(self) -> bool:
+        """
+        True if the answer is a closed array: a non-empty one, or a bare "[]" with
+        no text around it. Only complete answers are worth caching.
+        """
+        return self.done or (self.empty_array_seen and not self.prose_seen and not self.in_array)
+
+
+def _unwrap_object(data: Dict[str, Any]) -> List[Any]:
+    """
+    Constrained output (format: json / schema) is often an object: either a single
+    attribute or a wrapper such as {"attributes": [...]}. Returns the items inside.
+    """
+    if 'alias' in data and 'type' in data:
+        return [data]
+    for value in data.values():
+        if isinstance(value, list):
+            return value
+    raise ValueError("JSON object in Ollama response does not contain an array of attributes.")
+
+
+def scan_json_array(text: str) -> Tuple[List[Any], bool]:
+    """
+    Returns the elements of the first non-empty balanced JSON array in the text
+    and whether the answer was complete (see JsonArrayStreamParser.complete).
+    Brackets in surrounding prose are skipped, malformed elements are dropped
+    one by one and a truncated array yields the elements completed before the cut.
+    Raises ValueError if the text contains no array at all.
+    """
+    stripped = text.strip()
+    if stripped.startswith('{'):
+        try:
+            data = json.loads(stripped)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict):
+            return _unwrap_object(data), True
+
+    parser = JsonArrayStreamParser()
+    elements = parser.feed(text)
+    if not parser.found_array:
+        raise ValueError("No valid JSON array found in Ollama response.")
+    if parser.in_array and not parser.done:
+        logger.warning(f"JSON array in Ollama response is not terminated; recovered {len(elements)} element(s).")
+    return elements, parser.complete
+
+
+def extract_json_array(text: str) -> List[Any]:
+    """The elements of the answer's JSON array (see scan_json_array)."""
+    return scan_json_array(text)[0]
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Any, Awaitable, Callable, Iterable, Iterator, Optional, Tuple
+from config import (
+    OLLAMA_API_URL, OLLAMA_MODEL, OLLAMA_BACKENDS, OLLAMA_HEDGE_AFTER,
+    OLLAMA_CIRCUIT_FAILURES, OLLAMA_CIRCUIT_COOLDOWN, logger
+)
+from metrics import metrics
+
+
+class LLMBackend:
+    """One Ollama endpoint with its load, health and latency statistics."""
+
+    def __init__(self, url: str, model: str):
+        self.url = url
+        self.model = model
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.latency_ewma: Optional[float] = None
+
+    def __repr__(self):
+        return f"LLMBackend({self.url}, {self.model})"
+
+
+class LLMPool:
+    """
+    Пул бэкендов Ollama: запрос уходит на наименее загруженный здоровый хост,
+    после failure_threshold ошибок подряд хост выключается (circuit breaker)
+    на cooldown_seconds, а медленный запрос дублируется на второй хост
+    через hedge_after секунд — побеждает первый ответ.
+    """
+
+    def __init__(self, backends: List[LLMBackend], failure_threshold: int = 3, cooldown_seconds: float = 30.0,
+                 hedge_after: Optional[float] = None):
+        if not backends:
+            raise ValueError("LLM pool needs at least one backend.")
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.hedge_after = hedge_after if hedge_after and len(backends) > 1 else None
+        self._lock = threading.Lock()
+
+    def select(self, exclude: Iterable[LLMBackend] = ()) -> Optional[LLMBackend]:
+        """
+        Reserves the least-loaded healthy backend. If every circuit is open, the
+        backend that recovers first is probed. Returns None if all are excluded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend not in exclude]
+            if not candidates:
+                return None
+            healthy = [backend for backend in candidates if backend.open_until <= now]
+            if healthy:
+                backend = min(healthy, key=lambda b: (b.in_flight, b.latency_ewma or 0.0))
+            else:
+                backend = min(candidates, key=lambda b: b.open_until)
+            backend.in_flight += 1
+            return backend
+
+    def release(self, backend: LLMBackend, ok: Optional[bool], latency: float):
+        """Frees the backend; ok=None (an abandoned request) leaves its health statistics untouched."""
+        with self._lock:
+            backend.in_flight -= 1
+            if ok is None:
+                return
+            if ok:
+                backend.consecutive_failures = 0
+                backend.open_until = 0.0
+                backend.latency_ewma = latency if backend.latency_ewma is None else 0.8 * backend.latency_ewma + 0.2 * latency
+                return
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.failure_threshold:
+                backend.open_until = time.monotonic() + self.cooldown_seconds
+                metrics.increment("llm_circuit_opened")
+                logger.warning(f"LLM backend {backend.url} failed {backend.consecutive_failures} times in a row; "
+                               f"circuit open for {self.cooldown_seconds:.0f}s.")
+
+    @contextmanager
+    def lease(self, backend: Optional[LLMBackend] = None) -> Iterator[LLMBackend]:
+        """
+        Holds a backend for the duration of the block; an exception from the block
+        counts as a failure of the backend. Used directly for streaming requests.
+        """
+        backend = backend or self.select()
+        started = time.perf_counter()
+        ok: Optional[bool] = True
+        try:
+            yield backend
+        except Exception:
+            ok = False
+            raise
+        except BaseException:
+            # Отмена (проигравший hedged-запрос, отменённый вызывающий) — не сбой бэкенда
+            ok = None
+            raise
+        finally:
+            self.release(backend, ok, time.perf_counter() - started)
+
+    async def _run_async(self, backend: LLMBackend, fn: Callable[[LLMBackend], Awaitable[Any]]) -> Any:
+        with self.lease(backend):
+            return await fn(backend)
+
+    async def call_async(self, fn: Callable[[LLMBackend], Awaitable[Any]]) -> Any:
+        """
+        Runs fn(backend) on the best backend, hedging to a second one if it is
+        slow. The losing request, or every request if the caller is cancelled,
+        is cancelled so the backend is released at once.
+        """
+        primary = self.select()
+        if self.hedge_after is None:
+            return await self._run_async(primary, fn)
+
+        primary_task = asyncio.ensure_future(self._run_async(primary, fn))
+        tasks = {primary_task}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if done:
+                return primary_task.result()
+
+            secondary = self.select(exclude=[primary])
+            if secondary is None:
+                return await primary_task
+            logger.info(f"LLM request on {primary.url} is slow; hedging to {secondary.url}.")
+            metrics.increment("llm_hedged_requests")
+            tasks.add(asyncio.ensure_future(self._run_async(secondary, fn)))
+            pending = set(tasks)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # И проигравший запрос, и запросы отменённого вызывающего освобождают бэкенд сразу
+            for task in tasks:
+                task.cancel()
+
+
+def parse_backends(spec: str, default_model: str) -> List[Tuple[str, str]]:
+    """Parses 'url|model,url|model' (model is optional) into (url, model) pairs."""
+    backends = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, model = entry.partition("|")
+        backends.append((url.strip(), model.strip() or default_model))
+    return backends
+
+
+def build_pool_from_config() -> LLMPool:
+    """Builds the pool from OLLAMA_BACKENDS, falling back to OLLAMA_API_URL / OLLAMA_MODEL."""
+    specs = parse_backends(OLLAMA_BACKENDS, OLLAMA_MODEL) or [(OLLAMA_API_URL, OLLAMA_MODEL)]
+    return LLMPool(
+        [LLMBackend(url, model) for url, model in specs],
+        failure_threshold=OLLAMA_CIRCUIT_FAILURES,
+        cooldown_seconds=OLLAMA_CIRCUIT_COOLDOWN,
+        hedge_after=OLLAMA_HEDGE_AFTER,
+    )
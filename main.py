@@ -1,6 +1,15 @@
+import sys
+from config import configure_logging
 from orchestrator import process_creation_request
 
 if __name__ == "__main__":
+    configure_logging()
+    if len(sys.argv) > 1:
+        # python main.py <manifest.jsonl | каталог с заданиями>
+        from batch import run_batch
+        summary = run_batch(sys.argv[1])
+        sys.exit(0 if all(summary.values()) else 1)
+
     user_request_text = "Создай в шаблоне oa.25 имя шаблона Тест ИИ 2 необходимые мне атрибуты по вот таким данным XML"
     sample_xml = """
         <root>
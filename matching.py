@@ -0,0 +1,188 @@
+import functools
+import re
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+from config import MATCH_TOP_K, MATCH_MIN_SCORE, MATCH_EMBEDDING_MODEL, logger
+
+# Разбиение имён на слова: camelCase, границы букв и цифр, разделители
+_TOKEN_RE = re.compile(r"[A-ZА-ЯЁ]?[a-zа-яё]+|[A-ZА-ЯЁ]+(?![a-zа-яё])|\d+|[^\W\d_]+", re.UNICODE)
+_NON_ALNUM_RE = re.compile(r"[\W_]+", re.UNICODE)
+_TRAILING_DIGITS_RE = re.compile(r"\d+$")
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya",
+})
+
+# Русские слова (в транслитерации), которые в выгрузках встречаются вместо английских
+_GLOSSARY = {
+    "imya": "name", "nazvanie": "name", "naimenovanie": "name", "nomer": "number", "data": "date",
+    "summa": "sum", "valyuta": "currency", "kod": "code", "tip": "type", "schet": "account",
+    "kolichestvo": "quantity", "tsena": "price", "opisanie": "description", "kommentariy": "comment",
+    "adres": "address", "telefon": "phone", "gorod": "city", "strana": "country", "organizatsiya": "organization",
+}
+
+
+def match_key(value: Any) -> str:
+    """
+    Canonical key for exact matching: lower case, no separators, Cyrillic
+    transliterated, so 'SUMMA_WITH_NDS', 'SummaWithNds' and 'summa-with-nds' agree.
+    """
+    return _NON_ALNUM_RE.sub("", str(value)).lower().translate(_TRANSLIT)
+
+
+def _fuzzy_key(value: Any) -> str:
+    """
+    Key for similarity scoring only: words are split, transliterated and common
+    Russian words are mapped to English, so 'Имя' comes close to 'NAME'.
+    """
+    tokens = _TOKEN_RE.findall(str(value))
+    return "".join(_GLOSSARY.get(token, token) for token in (token.lower().translate(_TRANSLIT) for token in tokens))
+
+
+def describe_existing_attribute(attr: Dict[str, Any]) -> Dict[str, Any]:
+    """Extracts alias, name and type from a ListAllProperties item (field names vary in case)."""
+    alias = attr.get('alias', attr.get('Alias', attr.get('name', 'Unknown')))
+    attributes = attr.get('attributes') or attr.get('Attributes') or {}
+    name = attributes.get('Name', alias) if isinstance(attributes, dict) else alias
+    type_info = attr.get('type', attr.get('Type', 'Unknown'))
+    return {"alias": alias, "name": name, "type": type_info}
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"^{key}$"
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+@functools.lru_cache(maxsize=2)
+def _load_embedding_model(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device="cpu")
+
+
+class _EmbeddingScorer:
+    """Optional CPU embeddings (sentence-transformers) for names that share no characters."""
+
+    def __init__(self, model_name: str, texts: List[str]):
+        self._model = _load_embedding_model(model_name)
+        self._vectors = self._model.encode(texts, normalize_embeddings=True)
+
+    def add(self, text: str):
+        import numpy as np
+        self._vectors = np.vstack([self._vectors, self._model.encode([text], normalize_embeddings=True)])
+
+    def scores(self, text: str) -> List[float]:
+        vector = self._model.encode([text], normalize_embeddings=True)[0]
+        return [float(score) for score in self._vectors @ vector]
+
+
+class AttributeMatchIndex:
+    """
+    Matching index over the existing attributes of a template (ListAllProperties
+    items). Exact matches are answered from a hash map of match_key keys; fuzzy
+    candidates come from a trigram inverted index over the glossary-mapped keys,
+    so only attributes sharing trigrams with the field are ever scored.
+    """
+
+    def __init__(self, attributes: Iterable[Dict[str, Any]], embedding_model: str = MATCH_EMBEDDING_MODEL):
+        self.described: List[Dict[str, Any]] = []
+        self._exact: Dict[str, int] = {}
+        self._stems: List[Set[str]] = []
+        # Триграмма -> (атрибут, номер ключа): alias и name оцениваются по отдельности
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._trigram_counts: List[List[int]] = []
+        self._embedding_model = embedding_model
+        self._embeddings: Optional[_EmbeddingScorer] = None
+        for attr in attributes or []:
+            self.add(attr)
+
+    def add(self, attr: Dict[str, Any]):
+        """
+        Indexes one more attribute (e.g. one just submitted for creation), so a run
+        keeps a single index instead of rebuilding it for every plan and prompt.
+        """
+        described = describe_existing_attribute(attr)
+        index = len(self.described)
+        self.described.append(described)
+        for key in {match_key(described["alias"]), match_key(described["name"])} - {"", "unknown"}:
+            self._exact.setdefault(key, index)
+        keys = sorted({_fuzzy_key(described["alias"]), _fuzzy_key(described["name"])} - {"", "unknown"})
+        self._stems.append({_TRAILING_DIGITS_RE.sub("", key) for key in keys})
+        grams_by_key = [_trigrams(key) for key in keys]
+        for slot, grams in enumerate(grams_by_key):
+            for gram in grams:
+                self._postings[gram].append((index, slot))
+        self._trigram_counts.append([len(grams) for grams in grams_by_key])
+        if self._embeddings is not None:
+            self._embeddings.add(described["name"])
+
+    def __len__(self) -> int:
+        return len(self.described)
+
+    def _embedding_scorer(self) -> Optional[_EmbeddingScorer]:
+        """Builds the embeddings on the first fuzzy query; exact lookups never pay for them."""
+        if self._embedding_model and self._embeddings is None and self.described:
+            try:
+                self._embeddings = _EmbeddingScorer(self._embedding_model, [d["name"] for d in self.described])
+            except (ImportError, OSError) as e:
+                logger.warning(f"Embedding model {self._embedding_model} is unavailable ({e}); using trigrams only.")
+                self._embedding_model = ""
+        return self._embeddings
+
+    def covers(self, field_name: str) -> bool:
+        """True if an attribute with the same canonical key exists (the planner's coverage check)."""
+        return match_key(field_name) in self._exact
+
+    def _scores(self, field_name: str) -> Dict[int, float]:
+        exact = self._exact.get(match_key(field_name))
+        if exact is not None:
+            return {exact: 1.0}
+        key = _fuzzy_key(field_name)
+        if not key:
+            return {}
+
+        grams = _trigrams(key)
+        shared = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in grams))
+        best_dice: Dict[int, float] = {}
+        for (index, slot), count in shared.items():
+            # Коэффициент Дайса по триграммам отдельно для alias и name; берётся лучший
+            dice = 2.0 * count / (len(grams) + self._trigram_counts[index][slot])
+            if dice > best_dice.get(index, 0.0):
+                best_dice[index] = dice
+        scores = {}
+        stem = _TRAILING_DIGITS_RE.sub("", key)
+        for index, dice in best_dice.items():
+            # Одинаковая основа без числового суффикса (NUMBER1 ~ NUMBER2) — почти совпадение
+            scores[index] = 0.9 if stem and stem in self._stems[index] and dice < 0.9 else min(dice, 0.99)
+
+        embeddings = self._embedding_scorer()
+        if embeddings is not None:
+            for index, score in enumerate(embeddings.scores(field_name)):
+                if score > scores.get(index, 0.0):
+                    scores[index] = score
+        return scores
+
+    def best_match(self, field_name: str, min_score: float = MATCH_MIN_SCORE) -> Optional[Tuple[Dict[str, Any], float]]:
+        """The most similar existing attribute (alias, name, type) and its score in [0, 1]."""
+        scores = self._scores(field_name)
+        if not scores:
+            return None
+        index, score = max(scores.items(), key=lambda item: item[1])
+        return (self.described[index], score) if score >= min_score else None
+
+    def top_k(self, field_names: Iterable[str], k: int = MATCH_TOP_K,
+              min_score: float = MATCH_MIN_SCORE) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        The k most similar attributes for every field, merged and ordered by
+        their best score across fields.
+        """
+        best: Dict[int, float] = {}
+        for field_name in field_names:
+            ranked = sorted(self._scores(field_name).items(), key=lambda item: item[1], reverse=True)[:k]
+            for index, score in ranked:
+                if score >= min_score and score > best.get(index, 0.0):
+                    best[index] = score
+        return [(self.described[index], score) for index, score in sorted(best.items(), key=lambda item: item[1], reverse=True)]
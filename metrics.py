@@ -0,0 +1,162 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional
+
+# Сколько последних длительностей хранить на этап для перцентилей
+_MAX_SAMPLES_PER_STAGE = 1000
+
+# Поля ответа Ollama со статистикой генерации (длительности — в наносекундах)
+_OLLAMA_USAGE_FIELDS = (
+    "prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration", "load_duration", "total_duration"
+)
+
+
+class MetricsRegistry:
+    """
+    Collects per-stage durations, counters (retries, backoff, cache hits, tokens)
+    and HTTP status histograms for a process. Exportable as a JSON run report
+    or in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._started_at = time.time()
+            self._stage_count: Dict[str, int] = defaultdict(int)
+            self._stage_total: Dict[str, float] = defaultdict(float)
+            self._stage_max: Dict[str, float] = defaultdict(float)
+            self._stage_samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=_MAX_SAMPLES_PER_STAGE))
+            self._counters: Dict[str, float] = defaultdict(float)
+            self._http_statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self._stage_count[stage] += 1
+            self._stage_total[stage] += seconds
+            self._stage_max[stage] = max(self._stage_max[stage], seconds)
+            self._stage_samples[stage].append(seconds)
+
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def record_http_status(self, endpoint: str, status: Any):
+        with self._lock:
+            self._http_statuses[endpoint][str(status)] += 1
+
+    def record_ollama_usage(self, response_data: Dict[str, Any]):
+        """Accumulates token counts and durations reported by Ollama."""
+        for field in _OLLAMA_USAGE_FIELDS:
+            value = response_data.get(field)
+            if isinstance(value, (int, float)):
+                self.increment(f"ollama_{field}", value)
+
+    @staticmethod
+    def _percentile(sorted_values, fraction: float) -> float:
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+        return sorted_values[index]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for stage, count in self._stage_count.items():
+                samples = sorted(self._stage_samples[stage])
+                stages[stage] = {
+                    "count": count,
+                    "total_seconds": round(self._stage_total[stage], 6),
+                    "max_seconds": round(self._stage_max[stage], 6),
+                    "p50_seconds": round(self._percentile(samples, 0.5), 6),
+                    "p99_seconds": round(self._percentile(samples, 0.99), 6),
+                }
+            return {
+                "started_at": self._started_at,
+                "elapsed_seconds": round(time.time() - self._started_at, 3),
+                "stages": stages,
+                "counters": dict(self._counters),
+                "http_statuses": {endpoint: dict(statuses) for endpoint, statuses in self._http_statuses.items()},
+            }
+
+    def write_report(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix: str = "proxyai") -> str:
+        report = self.report()
+        lines = [
+            f"# TYPE {prefix}_stage_duration_seconds summary",
+        ]
+        for stage, data in report["stages"].items():
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{stage}",quantile="0.5"}} {data["p50_seconds"]}')
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{stage}",quantile="0.99"}} {data["p99_seconds"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {data["total_seconds"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {data["count"]}')
+        for name, value in report["counters"].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_http_responses_total counter")
+        for endpoint, statuses in report["http_statuses"].items():
+            for status, count in statuses.items():
+                lines.append(f'{prefix}_http_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def timed(stage: str, registry: Optional[MetricsRegistry] = None) -> Callable:
+    """
+    Decorator recording the duration of a function as a stage. Works for plain
+    functions, coroutines and (async) generators; for generators the stage
+    covers the whole iteration.
+    """
+    def decorator(func: Callable) -> Callable:
+        def get_registry() -> MetricsRegistry:
+            return registry or metrics
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                with get_registry().stage(stage):
+                    async for item in func(*args, **kwargs):
+                        yield item
+            return async_gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_registry().stage(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                with get_registry().stage(stage):
+                    yield from func(*args, **kwargs)
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_registry().stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
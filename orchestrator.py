@@ -1,103 +1,335 @@
-from typing import List, Dict, Any
-from platform_api import get_existing_attributes, create_attribute_in_platform, notify_platform_completion
-from ai_integration import query_ai_ollama
-from xml_parser import parse_xml_fields, build_ai_prompt
-from config import logger
+import asyncio
+import contextlib
+import functools
+import threading
+import weakref
+from typing import List, Dict, Any, AsyncContextManager, Optional, Set, Tuple, Union
+from platform_api import get_existing_attributes_async, notify_platform_completion_async
+from ai_integration import query_ai_ollama_async, stream_ai_ollama_async
+from async_http import run_sync
+from xml_parser import XmlSource, INSTRUCTION_MANUAL, parse_xml_schema, representative_values, build_ai_prompt
+from planner import plan_missing_fields, chunk_fields
+from matching import AttributeMatchIndex
+from type_inference import infer_attributes
+from submission import CreationSubmitter, get_submitter
+from journal import RunJournal, NullJournal, JournalState, new_run_id
+from config import (
+    OLLAMA_STREAM, METRICS_REPORT_PATH, AI_CHUNK_SIZE, AI_MAX_PARALLEL_CHUNKS, AI_FIELD_MAX_ATTEMPTS, JOURNAL_DIR,
+    MATCH_DUPLICATE_SCORE, logger
+)
+from metrics import metrics, timed
 
-def query_ai(prompt: str, template_id: str) -> List[Dict[str, Any]]:
-    return query_ai_ollama(prompt, template_id)
+_template_locks: Dict[str, threading.Lock] = {}
+_template_locks_guard = threading.Lock()
+_async_template_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Lock]]" = weakref.WeakKeyDictionary()
 
-def process_creation_request(user_text_request: str, xml_data: str, template_id: str, template_name: str):
+PendingCreation = Tuple[Dict[str, Any], "asyncio.Future[bool]"]
+Journal = Union[RunJournal, NullJournal]
+
+# Запас волн сверх числа попыток на поле — на повторное создание атрибутов, которые не удалось создать
+ITERATION_SLACK = 1
+
+def template_lock(template_id: str) -> threading.Lock:
+    """Returns the lock that serializes runs against one template (container)."""
+    with _template_locks_guard:
+        return _template_locks.setdefault(template_id, threading.Lock())
+
+def _async_template_lock(template_id: str) -> asyncio.Lock:
+    """Per-template lock for runs sharing one event loop."""
+    locks = _async_template_locks.setdefault(asyncio.get_running_loop(), {})
+    return locks.setdefault(template_id, asyncio.Lock())
+
+@contextlib.asynccontextmanager
+async def _unlimited():
+    yield
+
+def _prepare_attribute_json(attr_json: Any, template_id: str) -> Optional[Dict[str, Any]]:
+    """Validates a generated attribute and forces it into the target template."""
+    if not isinstance(attr_json, dict) or 'alias' not in attr_json or 'type' not in attr_json:
+        logger.warning(f"Skipping invalid attribute JSON: {attr_json}")
+        return None
+
+    if attr_json.get('containerId') != template_id:
+        logger.info(f"Setting containerId for attribute {attr_json.get('alias')} to {template_id}")
+        attr_json['containerId'] = template_id
+
+    if 'attributes' in attr_json and isinstance(attr_json['attributes'], dict):
+        if attr_json['attributes'].get('ObjectApp') is None:
+            logger.info(f"Setting ObjectApp in attributes for {attr_json.get('alias')}")
+            attr_json['attributes']['ObjectApp'] = "sln.2"
+
+    return attr_json
+
+def _create_and_report(attr_jsons: List[Dict[str, Any]], results: List[bool]) -> int:
+    """Logs failed creations and returns the number of successful ones."""
+    for attr_json, created in zip(attr_jsons, results):
+        if not created:
+            logger.error(f"Failed to create attribute defined by: {attr_json}")
+    return sum(results)
+
+def write_metrics_report():
+    """Writes the metrics report to METRICS_REPORT_PATH, if configured."""
+    if METRICS_REPORT_PATH:
+        metrics.write_report(METRICS_REPORT_PATH)
+        logger.info(f"Metrics report written to {METRICS_REPORT_PATH}")
+
+def _open_journal(run_id: str) -> Journal:
+    return RunJournal(JOURNAL_DIR, run_id) if JOURNAL_DIR else NullJournal(run_id)
+
+def _journal_result(journal: Journal, attr_json: Dict[str, Any], task: "asyncio.Future[bool]"):
+    """Writes the outcome of a CreateProperty call to the journal as soon as it is known."""
+    if task.cancelled():
+        return
+    error = task.exception()
+    journal.record("create_result", alias=attr_json['alias'], created=bool(error is None and task.result()),
+                   error=str(error) if error else None)
+
+def _start_creation(attr_json: Dict[str, Any], pending: List[PendingCreation], known: AttributeMatchIndex,
+                    submitter: CreationSubmitter, journal: Journal) -> bool:
     """
-    Main function to orchestrate the attribute creation process.
+    Hands an attribute to the submission stage and adds it to the run's matching
+    index, so planning and prompts count it as existing.
+    Attributes that already exist or are being created (e.g. produced by another chunk) are skipped.
     """
-    logger.info("Starting attribute creation process...")
-    try:
-        logger.info("Step 1: Parsing XML data...")
-        xml_fields = parse_xml_fields(xml_data)
+    task, submitted = submitter.submit(attr_json)
+    if not submitted:
+        logger.info(f"Skipping duplicate attribute {attr_json['alias']}: already exists or is being created.")
+        return False
+    task.add_done_callback(functools.partial(_journal_result, journal, attr_json))
+    pending.append((attr_json, task))
+    known.add(attr_json)
+    return True
 
-        logger.info("Step 2: Fetching existing attributes from Platform API...")
-        existing_attrs = get_existing_attributes(template_id)
+async def _drain(pending: List[PendingCreation]) -> Tuple[int, int]:
+    """Waits for in-flight creations; returns (successes, attempts)."""
+    results = await asyncio.gather(*(task for _, task in pending))
+    return _create_and_report([attr_json for attr_json, _ in pending], list(results)), len(pending)
 
-        instruction_manual_content = """
-Создание атрибутов
-Для создания атрибута используется метод System Core API / Solution / ObjectAppService / CreateProperty
-...
-(Include the relevant parts of the instruction manual here, or load from a file)
-...
-"""  # Замените на реальное содержимое
+def _accept_generated(item: Any, template_id: str, pending: List[PendingCreation], known: AttributeMatchIndex,
+                      submitter: CreationSubmitter, journal: Journal) -> bool:
+    """Journals a generated definition before starting its creation; True if it was submitted."""
+    attr_json = _prepare_attribute_json(item, template_id)
+    if attr_json is None:
+        return False
+    journal.record("model_output", item=attr_json)
+    return _start_creation(attr_json, pending, known, submitter, journal)
 
-        logger.info("Step 3: Building prompt for AI...")
-        template_info = {"id": template_id, "name": template_name}
-        ai_prompt = build_ai_prompt(
-            user_request=user_text_request,
-            xml_fields=xml_fields,
-            template_info=template_info,
-            existing_attributes=existing_attrs,
-            instruction_manual_content=instruction_manual_content
-        )
+async def _generate(ai_prompt: str, template_id: str, pending: List[PendingCreation], known: AttributeMatchIndex,
+                    submitter: CreationSubmitter, journal: Journal) -> int:
+    """
+    Queries the AI for attribute definitions. Every valid definition starts being
+    created immediately, so creation overlaps with the rest of the generation.
+    Returns the number of definitions submitted for creation (duplicates excluded).
+    """
+    submitted = 0
+    if OLLAMA_STREAM:
+        async for item in stream_ai_ollama_async(ai_prompt, template_id):
+            submitted += _accept_generated(item, template_id, pending, known, submitter, journal)
+    else:
+        for item in await query_ai_ollama_async(ai_prompt, template_id):
+            submitted += _accept_generated(item, template_id, pending, known, submitter, journal)
+    return submitted
 
-        iteration = 0
-        max_iterations = 5
-        while iteration < max_iterations:
-            iteration += 1
-            logger.info(f"--- Iteration {iteration} ---")
+async def _gather_or_cancel(coroutines: List[Any]) -> List[Any]:
+    """Like asyncio.gather, but cancels the remaining coroutines if one of them fails."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
 
-            logger.info("Step 4 & 5: Querying AI for attribute definitions...")
-            ai_generated_json_list = query_ai(ai_prompt, template_id)
+def process_creation_request(user_text_request: str, xml_data: Optional[XmlSource], template_id: str, template_name: str,
+                             field_samples: Optional[Dict[str, List[str]]] = None, run_id: Optional[str] = None,
+                             resume: bool = False) -> str:
+    """
+    Main function to orchestrate the attribute creation process.
+    xml_data may be XML text, an os.PathLike path or a binary stream. An already
+    parsed schema (field -> sample values) may be passed via field_samples instead.
+    With JOURNAL_DIR set every step is journaled under run_id; resume=True
+    continues a crashed run with that id instead of starting over.
+    Runs against the same template are serialized. Thin synchronous wrapper
+    around process_creation_request_async. Returns the run id.
+    """
+    with template_lock(template_id):
+        try:
+            return run_sync(process_creation_request_async(user_text_request, xml_data, template_id, template_name,
+                                                           field_samples, run_id, resume))
+        finally:
+            write_metrics_report()
 
-            if not ai_generated_json_list:
-                logger.info("AI returned empty list. Assuming all attributes are created or no new ones are needed.")
-                break
+@timed("process_creation_request")
+async def process_creation_request_async(user_text_request: str, xml_data: Optional[XmlSource], template_id: str, template_name: str,
+                                         field_samples: Optional[Dict[str, List[str]]] = None, run_id: Optional[str] = None,
+                                         resume: bool = False, slot: Optional[AsyncContextManager] = None) -> str:
+    """
+    Async variant of process_creation_request; runs on the caller's event loop.
+    slot (e.g. an asyncio.Semaphore) bounds how many runs execute at once; it is
+    taken after the template lock, so a run waiting for its template holds no slot.
+    Returns the run id.
+    """
+    if resume and not run_id:
+        raise ValueError("Resuming a run requires its run_id.")
+    journal = _open_journal(run_id or new_run_id())
+    if resume and not journal.exists():
+        raise ValueError(f"Cannot resume run {run_id}: "
+                         + (f"no journal in {JOURNAL_DIR}." if JOURNAL_DIR else "JOURNAL_DIR is not set."))
+    try:
+        async with _async_template_lock(template_id), slot or _unlimited():
+            await _process_creation_request(user_text_request, xml_data, template_id, template_name, field_samples,
+                                            journal, journal.replay() if resume else None)
+    finally:
+        journal.close()
+    return journal.run_id
 
-            logger.info(f"AI generated {len(ai_generated_json_list)} attribute(s) to create.")
+async def _process_creation_request(user_text_request: str, xml_data: Optional[XmlSource], template_id: str, template_name: str,
+                                    field_samples: Optional[Dict[str, List[str]]], journal: Journal,
+                                    resumed: Optional[JournalState]):
+    if resumed is not None:
+        if resumed.template_id not in (None, template_id):
+            raise ValueError(f"Run {journal.run_id} belongs to template {resumed.template_id}, not {template_id}.")
+        if resumed.finished:
+            logger.info(f"Run {journal.run_id} has already completed; nothing to resume.")
+            return
+        logger.info(f"Resuming run {journal.run_id}: {len(resumed.created)} attribute(s) created, "
+                    f"{len(resumed.outstanding())} generated attribute(s) outstanding.")
+        if field_samples is None and resumed.field_samples is not None:
+            logger.info("Using the XML schema recorded in the journal.")
+            field_samples = resumed.field_samples
 
-            creation_successes = 0
-            for attr_json in ai_generated_json_list:
-                if not isinstance(attr_json, dict) or 'alias' not in attr_json or 'type' not in attr_json:
-                    logger.warning(f"Skipping invalid attribute JSON: {attr_json}")
-                    continue
+    logger.info(f"Starting attribute creation process for template {template_id} (run {journal.run_id})...")
+    journal.record("run_started", run_id=journal.run_id, template_id=template_id, template_name=template_name,
+                   user_request=user_text_request, resume=resumed is not None)
+    pending: List[PendingCreation] = []
+    submitter = get_submitter()
+    submitter.reset_stats(template_id)
+    try:
+        if field_samples is None:
+            logger.info("Step 1 & 2: Parsing XML data and fetching existing attributes in parallel...")
+            loop = asyncio.get_running_loop()
+            field_samples, existing_attrs = await asyncio.gather(
+                loop.run_in_executor(None, parse_xml_schema, xml_data),
+                get_existing_attributes_async(template_id)
+            )
+        else:
+            logger.info("Step 2: Fetching existing attributes from Platform API...")
+            existing_attrs = await get_existing_attributes_async(template_id)
+        submitter.seed(template_id, existing_attrs)
+        if resumed is None or resumed.field_samples is None:
+            journal.record("schema", field_samples=field_samples)
+        xml_fields = representative_values(field_samples)
 
-                if attr_json.get('containerId') != template_id:
-                    logger.info(f"Setting containerId for attribute {attr_json.get('alias')} to {template_id}")
-                    attr_json['containerId'] = template_id
+        instruction_manual_content = INSTRUCTION_MANUAL
 
-                if 'attributes' in attr_json and isinstance(attr_json['attributes'], dict):
-                    if attr_json['attributes'].get('ObjectApp') is None:
-                        logger.info(f"Setting ObjectApp in attributes for {attr_json.get('alias')}")
-                        attr_json['attributes']['ObjectApp'] = "sln.2"
+        template_info = {"id": template_id, "name": template_name}
 
-                if create_attribute_in_platform(attr_json):
-                    creation_successes += 1
-                else:
-                    logger.error(f"Failed to create attribute defined by: {attr_json}")
+        # known — индекс существующих атрибутов и уже отправленных на создание; планировщик считает их существующими,
+        # поэтому следующая генерация идёт параллельно с отправкой предыдущей. Строится раз на волну и дополняется
+        known = AttributeMatchIndex(existing_attrs)
+        # declined — поля, чей чанк не дал ни одного нового атрибута или исчерпал AI_FIELD_MAX_ATTEMPTS; повторно их не запрашиваем
+        declined_fields: Set[str] = set()
+        field_attempts: Dict[str, int] = {}
+        iteration = 0
+        # Все открытые чанки уходят модели в одной волне, поэтому волн нужно не больше, чем попыток на поле
+        max_iterations = AI_FIELD_MAX_ATTEMPTS + ITERATION_SLACK
+        chunk_slots = asyncio.Semaphore(AI_MAX_PARALLEL_CHUNKS)
 
-            logger.info(f"Iteration {iteration}: Successfully sent creation requests for {creation_successes}/{len(ai_generated_json_list)} attributes.")
+        if resumed is not None and resumed.outstanding():
+            # Уже сгенерированные моделью атрибуты отправляются повторно без нового запроса к модели
+            for item in resumed.outstanding():
+                attr_json = _prepare_attribute_json(item, template_id)
+                if attr_json is not None:
+                    _start_creation(attr_json, pending, known, submitter, journal)
+            logger.info(f"Resubmitting {len(pending)} journaled attribute(s) that were not confirmed as created.")
 
-            if creation_successes == 0:
-                logger.warning("No attributes were successfully created in this iteration. Stopping to prevent infinite loop.")
-                break
+        async def generate_chunk(chunk: Dict[str, str]) -> int:
+            async with chunk_slots:
+                ai_prompt = build_ai_prompt(
+                    user_request=user_text_request,
+                    xml_fields=chunk,
+                    template_info=template_info,
+                    existing_attributes=known,
+                    instruction_manual_content=instruction_manual_content
+                )
+                return await _generate(ai_prompt, template_id, pending, known, submitter, journal)
 
-            logger.info("Re-fetching existing attributes after creation attempt...")
-            updated_existing_attrs = get_existing_attributes(template_id)
+        while True:
+            logger.info("Step 3: Planning which XML fields still need attributes...")
+            missing_fields = plan_missing_fields(xml_fields, known)
+            open_fields = [name for name in missing_fields if name not in declined_fields]
 
-            logger.info("Re-building AI prompt with updated existing attributes...")
-            ai_prompt = build_ai_prompt(
-                user_request=user_text_request,
-                xml_fields=xml_fields,
-                template_info=template_info,
-                existing_attributes=updated_existing_attrs,
-                instruction_manual_content=instruction_manual_content
+            if not open_fields or iteration >= max_iterations:
+                if not pending:
+                    break
+                logger.info(f"Waiting for {len(pending)} creation request(s) in flight...")
+                creation_successes, creation_attempts = await _drain(pending)
+                pending = []
+                logger.info(f"Successfully sent creation requests for {creation_successes}/{creation_attempts} attributes.")
+                if creation_successes == 0:
+                    logger.warning("No attributes were successfully created. Stopping to prevent infinite loop.")
+                    break
+                logger.info("Refreshing existing attributes after creation attempt (cached unless stale or conflicted)...")
+                existing_attrs = await get_existing_attributes_async(template_id)
+                submitter.seed(template_id, existing_attrs)
+                known = AttributeMatchIndex(existing_attrs)
+                continue
+
+            iteration += 1
+            logger.info(f"--- Iteration {iteration} ---")
+
+            # Почти совпадающие с существующими атрибутами поля (Имя ~ NAME) локально не создаём: пусть решит модель
+            near_duplicates = {}
+            for name in open_fields:
+                match = known.best_match(name, MATCH_DUPLICATE_SCORE)
+                if match:
+                    near_duplicates[name] = match[0]["alias"]
+            if near_duplicates:
+                logger.info(f"Fields similar to existing attributes, left to the AI: {near_duplicates}")
+            local_attr_jsons, inferred_ambiguous = infer_attributes(
+                {name: field_samples[name] for name in open_fields if name not in near_duplicates}, template_id
             )
+            ambiguous_fields = [name for name in open_fields if name in near_duplicates or name in inferred_ambiguous]
+            if local_attr_jsons:
+                logger.info(f"Creating {len(local_attr_jsons)} attribute(s) with locally inferred types...")
+                for attr_json in local_attr_jsons:
+                    _start_creation(attr_json, pending, known, submitter, journal)
+
+            chunks = chunk_fields({name: xml_fields[name] for name in ambiguous_fields}, AI_CHUNK_SIZE)
+            journal.record("planned", iteration=iteration, local=[attr_json['alias'] for attr_json in local_attr_jsons],
+                           chunks=[list(chunk) for chunk in chunks])
+            if chunks:
+                logger.info(f"Step 4 & 5: Querying AI for {len(ambiguous_fields)} field(s) in {len(chunks)} chunk(s)...")
+                submitted_counts = await _gather_or_cancel([generate_chunk(chunk) for chunk in chunks])
+                for chunk, submitted_count in zip(chunks, submitted_counts):
+                    for name in chunk:
+                        field_attempts[name] = field_attempts.get(name, 0) + 1
+                        if not submitted_count or field_attempts[name] >= AI_FIELD_MAX_ATTEMPTS:
+                            declined_fields.add(name)
+                if sum(submitted_counts):
+                    logger.info(f"AI generated {sum(submitted_counts)} new attribute(s) to create.")
+                else:
+                    logger.info("AI produced no new attributes. Assuming all attributes are created or no new ones are needed.")
 
-        if iteration >= max_iterations:
+        still_missing = plan_missing_fields(xml_fields, existing_attrs)
+        unresolved = declined_fields & set(still_missing)
+        if unresolved:
+            logger.warning(f"AI did not produce a matching attribute for {len(unresolved)} field(s) "
+                           f"after up to {AI_FIELD_MAX_ATTEMPTS} attempt(s): {sorted(unresolved)}")
+        if iteration >= max_iterations and still_missing:
             logger.warning(f"Maximum iterations ({max_iterations}) reached. Process might be incomplete.")
 
         logger.info("Final step: Notifying Platform API of completion.")
-        notify_platform_completion("Attribute creation process completed via proxy script.")
+        await notify_platform_completion_async("Attribute creation process completed via proxy script.")
         logger.info("Attribute creation process finished successfully.")
+        journal.record("run_finished", status="completed")
 
     except Exception as e:
+        for _, task in pending:
+            task.cancel()
         logger.error(f"An error occurred during the process: {e}", exc_info=True)
-        notify_platform_completion(f"Attribute creation process failed: {str(e)}")
-        raise
\ No newline at end of file
+        journal.record("run_finished", status="failed", error=str(e))
+        await notify_platform_completion_async(f"Attribute creation process failed: {str(e)}")
+        raise
+    finally:
+        submitter.log_summary(template_id)
@@ -0,0 +1,41 @@
+from typing import Dict, List, Any, Set, Union
+from config import logger
+from matching import AttributeMatchIndex, describe_existing_attribute, match_key
+
+
+def existing_attribute_keys(existing_attributes: List[Dict[str, Any]]) -> Set[str]:
+    """Collects canonical keys of the aliases and names of the attributes already in the template."""
+    keys = set()
+    for attr in existing_attributes or []:
+        described = describe_existing_attribute(attr)
+        for value in (described["alias"], described["name"]):
+            key = match_key(value)
+            if key and key != "unknown":
+                keys.add(key)
+    return keys
+
+
+def plan_missing_fields(xml_fields: Dict[str, str],
+                        existing_attributes: Union[List[Dict[str, Any]], AttributeMatchIndex]) -> Dict[str, str]:
+    """
+    Deterministically decides which XML fields still need an attribute.
+    A field counts as covered when its canonical key (case and separators
+    ignored, Cyrillic transliterated, see matching.match_key) equals the
+    canonical alias or name of an existing attribute. Similar but different
+    names (DATA vs DATE, DATE1 vs DATE3) are not covered. Field order is preserved.
+    existing_attributes may be a prebuilt AttributeMatchIndex, which is reused as is.
+    """
+    if isinstance(existing_attributes, AttributeMatchIndex):
+        index = existing_attributes
+    else:
+        index = AttributeMatchIndex(existing_attributes)
+    missing = {name: value for name, value in xml_fields.items() if not index.covers(name)}
+    logger.info(f"Plan: {len(xml_fields) - len(missing)} of {len(xml_fields)} XML fields already covered, {len(missing)} to create.")
+    return missing
+
+
+def chunk_fields(fields: Dict[str, str], chunk_size: int) -> List[Dict[str, str]]:
+    """Splits fields into independent batches of at most chunk_size, preserving order."""
+    items = list(fields.items())
+    chunk_size = max(1, chunk_size)
+    return [dict(items[start:start + chunk_size]) for start in range(0, len(items), chunk_size)]
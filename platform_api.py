@@ -1,9 +1,89 @@
-import requests
+import asyncio
 import json
-import time
 import random
-from typing import List, Dict, Any
-from config import PLATFORM_API_BASE_URL, PLATFORM_API_TOKEN, logger
+import weakref
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import aiohttp
+from async_http import get_async_session, run_sync
+from attribute_cache import TemplateAttributeCache
+from metrics import metrics, timed
+from config import (
+    PLATFORM_API_BASE_URL, PLATFORM_API_TOKEN, PLATFORM_MAX_WORKERS,
+    PLATFORM_MIN_WORKERS, PLATFORM_POOL_SIZE, ATTRIBUTE_CACHE_TTL,
+    ATTRIBUTE_CACHE_MAX_TEMPLATES, ATTRIBUTE_CACHE_PATH, logger
+)
+
+
+class AsyncAdaptiveRateLimiter:
+    """
+    Ограничитель параллельности с адаптацией под нагрузку (AIMD) для корутин
+    одного event loop. При ответе "слишком часто" лимит уменьшается вдвое,
+    после серии успешных вызовов — увеличивается на единицу.
+
+    Запросы, начатые до последнего снижения, уже учтены в нём: их сигналы
+    (on_rate_limited с номером поколения, см. generation) игнорируются, так что
+    одна волна отказов снижает лимит один раз.
+    """
+
+    def __init__(self, max_limit: int = PLATFORM_MAX_WORKERS, min_limit: int = PLATFORM_MIN_WORKERS, increase_after: int = 5):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.increase_after = increase_after
+        self.limit = self.max_limit
+        self._in_flight = 0
+        self._successes = 0
+        self.generation = 0
+        self._slot_freed = asyncio.Event()
+
+    async def __aenter__(self):
+        while self._in_flight >= self.limit:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        self._in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._in_flight -= 1
+        self._slot_freed.set()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.increase_after and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+            logger.debug(f"Rate limiter: concurrency raised to {self.limit}")
+            self._slot_freed.set()
+
+    def on_rate_limited(self, generation: Optional[int] = None):
+        """generation — значение self.generation на момент начала запроса (None — новое событие)."""
+        if generation is not None and generation != self.generation:
+            return
+        self._successes = 0
+        self.generation += 1
+        new_limit = max(self.min_limit, self.limit // 2)
+        if new_limit != self.limit:
+            self.limit = new_limit
+            logger.info(f"Rate limiter: concurrency lowered to {self.limit}")
+
+
+_async_rate_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAdaptiveRateLimiter]" = weakref.WeakKeyDictionary()
+
+
+def get_async_rate_limiter() -> AsyncAdaptiveRateLimiter:
+    """Returns the shared async limiter for the running event loop."""
+    loop = asyncio.get_running_loop()
+    limiter = _async_rate_limiters.get(loop)
+    if limiter is None:
+        limiter = _async_rate_limiters[loop] = AsyncAdaptiveRateLimiter()
+    return limiter
+
+
+attribute_cache = TemplateAttributeCache(
+    ttl_seconds=ATTRIBUTE_CACHE_TTL,
+    max_templates=ATTRIBUTE_CACHE_MAX_TEMPLATES,
+    db_path=ATTRIBUTE_CACHE_PATH or None
+)
+
 
 def get_platform_headers():
     """Generates headers for Platform API requests."""
@@ -12,146 +92,219 @@ def get_platform_headers():
         "Content-Type": "application/json"
     }
 
-def get_existing_attributes(template_id: str) -> List[Dict[str, Any]]:
+CREATE_PROPERTY_PATH = "/api/public/system/TeamNetwork/ObjectAppService/CreateProperty"
+LIST_ALL_PROPERTIES_PATH = "/api/public/system/TeamNetwork/ObjectAppService/ListAllProperties"
+COMPLETION_PATH = "/custom/creation_complete"
+
+# Исходы запроса CreateProperty
+CREATED = "created"
+ALREADY_EXISTS = "exists"
+RATE_LIMITED = "rate_limited"
+FAILED = "failed"
+
+
+def _error_message(text: str) -> str:
+    """The 'alias' error of a CreateProperty error body (a string or a list of strings), else the raw body."""
+    try:
+        body = json.loads(text)
+    except json.JSONDecodeError:
+        body = None
+    detail = body.get('alias') if isinstance(body, dict) else None
+    if isinstance(detail, list):
+        detail = "; ".join(str(part) for part in detail)
+    if detail:
+        return str(detail)
+    return text if text else 'No response body'
+
+
+def _classify_create_response(status_code: int, text: str, attribute_json: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Interprets a CreateProperty response and keeps the attribute cache in step
+    with it. Returns the outcome and the error message.
+    """
+    alias = attribute_json.get('alias', 'N/A')
+    container_id = attribute_json.get('containerId')
+    metrics.record_http_status("CreateProperty", status_code)
+
+    if status_code == 200:
+        logger.info(f"Successfully created attribute: {alias}")
+        attribute_cache.record_created(container_id, attribute_json)
+        return CREATED, ""
+
+    if status_code == 409:
+        logger.warning(f"Attribute already exists or conflict for {alias}: {text}")
+        attribute_cache.invalidate(container_id)
+        return ALREADY_EXISTS, text
+
+    if status_code == 500:
+        error_message = _error_message(text)
+
+        if "уже существует" in error_message:
+            logger.warning(f"Attribute with alias '{alias}' already exists in container '{container_id}'. Skipping creation.")
+            attribute_cache.invalidate(container_id)
+            return ALREADY_EXISTS, error_message
+        if "слишком часто" in error_message or "rate limit" in error_message.lower():
+            return RATE_LIMITED, error_message
+        logger.error(f"Server error (500) creating attribute {alias}: {error_message}")
+        return FAILED, error_message
+
+    if status_code == 404:
+        logger.error(f"Endpoint not found (404) for {alias}. Check API URL configuration: {text}")
+        logger.error("Request that caused 404:")
+        logger.error(f"  URL: {PLATFORM_API_BASE_URL}{CREATE_PROPERTY_PATH}")
+        return FAILED, text
+
+    logger.error(f"HTTP Error {status_code} creating attribute {alias}: {text}")
+    return FAILED, text
+
+
+def _rate_limit_delay(base_delay: float, attempt: int) -> float:
+    return base_delay * (2 ** attempt) + random.uniform(0, 1)
+
+
+def _record_backoff(delay: float):
+    metrics.increment("platform_retries")
+    metrics.increment("platform_backoff_seconds", delay)
+
+
+# --- asyncio-клиент Platform API (общий пул соединений на event loop) ---
+
+def _platform_async_session() -> aiohttp.ClientSession:
+    return get_async_session("platform", PLATFORM_POOL_SIZE)
+
+
+@timed("get_existing_attributes")
+async def get_existing_attributes_async(template_id: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
     """
     Fetches the list of existing attributes for a given template from the Platform API.
+    Served from the template attribute cache unless it is stale or force_refresh is set.
     """
-    url = f"{PLATFORM_API_BASE_URL}/api/public/system/TeamNetwork/ObjectAppService/ListAllProperties"
-    headers = get_platform_headers()
+    if not force_refresh:
+        cached = attribute_cache.get(template_id)
+        if cached is not None:
+            metrics.increment("attribute_cache_hits")
+            logger.info(f"Using {len(cached)} cached attributes for template {template_id}.")
+            return cached
+        metrics.increment("attribute_cache_misses")
 
+    url = f"{PLATFORM_API_BASE_URL}{LIST_ALL_PROPERTIES_PATH}"
     try:
-        response = requests.post(
-            url,
-            headers=headers,
-            data=template_id,
-            timeout=30
-        )
-        logger.info(f"template_id sent: {template_id}")
-        logger.info(f"Request URL: {response.url}")
-        logger.info(f"Request Headers: {response.request.headers}")
-        logger.info(f"Request Body: {response.request.body}")
-        response.raise_for_status()
-        
-        existing_attrs_data = response.json()
-        logger.info(f"Retrieved {len(existing_attrs_data)} existing attributes for template {template_id}.")
-        return existing_attrs_data
-    except requests.exceptions.RequestException as e:
+        async with _platform_async_session().post(
+            url, headers=get_platform_headers(), data=template_id.encode("utf-8"),
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            text = await response.text()
+            metrics.record_http_status("ListAllProperties", response.status)
+            if response.status >= 400:
+                logger.error(f"Error fetching existing attributes for template {template_id}: HTTP {response.status}")
+                logger.error(f"Response Text: {text}")
+                return []
+            existing_attrs_data = json.loads(text)
+    except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
         logger.error(f"Error fetching existing attributes for template {template_id}: {e}")
-        logger.error(f"Response Status Code: {getattr(e.response, 'status_code', 'N/A')}")
-        logger.error(f"Response Text: {getattr(e.response, 'text', 'N/A')}")
         return []
 
-def create_attribute_in_platform(attribute_json: Dict[str, Any]) -> bool:
+    logger.info(f"Retrieved {len(existing_attrs_data)} existing attributes for template {template_id}.")
+    attribute_cache.put(template_id, existing_attrs_data)
+    return existing_attrs_data
+
+
+@timed("create_attribute_in_platform")
+async def create_attribute_in_platform_async(attribute_json: Dict[str, Any], limiter: Optional[AsyncAdaptiveRateLimiter] = None) -> bool:
     """
     Sends a request to the Platform API to create a single attribute using the provided JSON.
-    Implements retry logic with exponential backoff for rate limiting (HTTP 500) and server errors.
+    Retries with exponential backoff on rate limiting (HTTP 500) and network errors;
+    every attempt holds a slot of the adaptive rate limiter. Any unexpected error
+    fails only this attribute.
     """
-    url = f"{PLATFORM_API_BASE_URL}/api/public/system/TeamNetwork/ObjectAppService/CreateProperty"
+    url = f"{PLATFORM_API_BASE_URL}{CREATE_PROPERTY_PATH}"
     alias = attribute_json.get('alias', 'N/A')
-    
+    limiter = limiter or get_async_rate_limiter()
+    session = _platform_async_session()
+    headers = get_platform_headers()
+
     max_retries = 5
     base_delay = 1
-    
-    logger.info(f"Creating attribute with alias: {alias}")
-    logger.debug(f"Attribute JSON payload: {json.dumps(attribute_json, indent=2, ensure_ascii=False)}")
-
-    headers = get_platform_headers()
 
+    logger.info(f"Creating attribute with alias: {alias}")
     for attempt in range(max_retries):
         try:
-            logger.debug("---- OUTGOING REQUEST DETAILS ----")
-            logger.debug(f"URL: {url}")
-            logger.debug(f"Method: POST")
-            logger.debug(f"Headers: {json.dumps(headers, indent=2, ensure_ascii=False)}")
-            logger.debug(f"Body (JSON): {json.dumps(attribute_json, indent=2, ensure_ascii=False)}")
-            logger.debug("---- END REQUEST DETAILS ----")
-            
-            response = requests.post(
-                url, 
-                headers=headers, 
-                json=attribute_json, 
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Successfully created attribute: {alias}")
-                return True
-                
-            elif response.status_code == 409:
-                logger.warning(f"Attribute already exists or conflict for {alias}: {response.text}")
-                return True
-                
-            elif response.status_code == 500:
-                try:
-                    error_data = response.json()
-                    error_message = error_data.get('alias', '')
-                except (json.JSONDecodeError, AttributeError):
-                    error_message = response.text if response.text else 'No response body'
-
-                if "уже существует" in error_message:
-                    logger.warning(f"Attribute with alias '{alias}' already exists in container '{attribute_json.get('containerId')}'. Skipping creation.")
-                    return True
-                elif "слишком часто" in error_message or "rate limit" in error_message.lower():
-                    logger.warning(f"Rate limit hit for {alias} (attempt {attempt + 1}/{max_retries}). Retrying...")
-                    if attempt < max_retries - 1:
-                        delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                        logger.debug(f"Waiting for {delay:.2f} seconds before retry...")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        logger.error(f"Max retries reached for {alias} due to rate limiting. Last error: {error_message}")
-                        return False
-                else:
-                    logger.error(f"Server error (500) creating attribute {alias}: {error_message}")
-                    return False
-                        
-            elif response.status_code == 404:
-                logger.error(f"Endpoint not found (404) for {alias}. Check API URL configuration: {response.text}")
-                logger.error("Request that caused 404:")
-                logger.error(f"  URL: {url}")
-                logger.error(f"  Headers: {headers}")
-                return False
-                
-            else:
-                logger.error(f"HTTP Error {response.status_code} creating attribute {alias}: {response.text}")
-                return False
-                
-        except requests.exceptions.Timeout:
-            logger.warning(f"Timeout error creating attribute {alias} (attempt {attempt + 1}/{max_retries})")
+            async with limiter:
+                generation = limiter.generation
+                async with session.post(url, headers=headers, json=attribute_json,
+                                        timeout=aiohttp.ClientTimeout(total=60)) as response:
+                    status_code = response.status
+                    text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Request error creating attribute {alias} (attempt {attempt + 1}/{max_retries}): {e!r}")
+            metrics.record_http_status("CreateProperty", "error")
             if attempt < max_retries - 1:
-                logger.debug(f"Waiting for {base_delay} seconds before retry...")
-                time.sleep(base_delay)
+                _record_backoff(base_delay)
+                await asyncio.sleep(base_delay)
                 continue
-            else:
-                logger.error(f"Max retries reached for {alias} due to timeout")
-                return False
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error creating attribute {alias}: {e}")
-            if attempt < max_retries - 1:
-                logger.debug(f"Waiting for {base_delay} seconds before retry...")
-                time.sleep(base_delay)
-                continue
-            else:
-                return False
-                
+            logger.error(f"Max retries reached for {alias}")
+            return False
+
+        try:
+            outcome, error_message = _classify_create_response(status_code, text, attribute_json)
         except Exception as e:
             logger.error(f"Unexpected error creating attribute {alias}: {e}", exc_info=True)
             return False
-    
-    logger.error(f"Failed to create attribute {alias} after {max_retries} attempts")
+        if outcome == RATE_LIMITED:
+            logger.warning(f"Rate limit hit for {alias} (attempt {attempt + 1}/{max_retries}). Retrying...")
+            metrics.increment("platform_rate_limited")
+            limiter.on_rate_limited(generation)
+            if attempt < max_retries - 1:
+                delay = _rate_limit_delay(base_delay, attempt)
+                _record_backoff(delay)
+                await asyncio.sleep(delay)
+                continue
+            logger.error(f"Max retries reached for {alias} due to rate limiting. Last error: {error_message}")
+            return False
+        if outcome == CREATED:
+            limiter.on_success()
+        return outcome != FAILED
+
     return False
 
-def notify_platform_completion(message: str):
-    """
-    Sends a final notification to the Platform API indicating the process is complete.
-    """
-    url = f"{PLATFORM_API_BASE_URL}/custom/creation_complete"
+
+async def create_attributes_in_platform_async(attribute_jsons: Iterable[Dict[str, Any]]) -> List[bool]:
+    """Creates many attributes concurrently; concurrency is governed by the async rate limiter."""
+    return list(await asyncio.gather(*(create_attribute_in_platform_async(attr_json) for attr_json in attribute_jsons)))
+
+
+async def notify_platform_completion_async(message: str):
+    """Sends a final notification to the Platform API indicating the process is complete."""
+    url = f"{PLATFORM_API_BASE_URL}{COMPLETION_PATH}"
     payload = {"status": "completed", "details": message}
     try:
         logger.info("Sending completion notification to Platform API.")
-        response = requests.post(url, headers=get_platform_headers(), json=payload, timeout=30)
-        response.raise_for_status()
+        async with _platform_async_session().post(url, headers=get_platform_headers(), json=payload,
+                                                  timeout=aiohttp.ClientTimeout(total=30)) as response:
+            metrics.record_http_status("creation_complete", response.status)
+            response.raise_for_status()
         logger.info("Completion notification sent successfully.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error sending completion notification: {e}")
\ No newline at end of file
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Error sending completion notification: {e!r}")
+
+
+# --- синхронный API: тонкие обёртки над asyncio-клиентом ---
+
+def get_existing_attributes(template_id: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+    """Synchronous wrapper around get_existing_attributes_async."""
+    return run_sync(get_existing_attributes_async(template_id, force_refresh))
+
+
+def create_attribute_in_platform(attribute_json: Dict[str, Any]) -> bool:
+    """Synchronous wrapper around create_attribute_in_platform_async."""
+    return run_sync(create_attribute_in_platform_async(attribute_json))
+
+
+def create_attributes_in_platform(attribute_jsons: Iterable[Dict[str, Any]]) -> List[bool]:
+    """Creates many attributes concurrently; returns the per-item results in input order."""
+    return run_sync(create_attributes_in_platform_async(attribute_jsons))
+
+
+def notify_platform_completion(message: str):
+    """Synchronous wrapper around notify_platform_completion_async."""
+    run_sync(notify_platform_completion_async(message))
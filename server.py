@@ -0,0 +1,260 @@
+"""
+Resident HTTP/JSON service: python server.py
+
+POST /jobs        {"request_text", "template_id", "template_name", "xml" | "field_samples", ["run_id", "resume"]}
+                  -> 202 {"job_id", "status"}; 503 when the queue is full
+                  ("xml" is the document itself, never a server-side path)
+GET  /jobs/<id>   -> job status
+GET  /health      -> liveness and queue depth
+GET  /metrics     -> Prometheus text format
+
+Jobs run on one persistent event loop, so the Platform API and Ollama
+connection pools stay warm between requests.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, Set
+from async_http import close_async_sessions
+from batch import REQUIRED_JOB_KEYS
+from config import configure_logging, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_QUEUE_SIZE, SERVER_JOB_HISTORY, logger
+from metrics import metrics
+from orchestrator import process_creation_request_async
+
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+class Job:
+    def __init__(self, spec: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.spec = spec
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.run_id: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "template_id": self.spec["template_id"],
+            "run_id": self.run_id,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobService:
+    """
+    Runs jobs as coroutines on a single background event loop that lives as
+    long as the service, together with its aiohttp sessions. At most `workers`
+    jobs run at once; jobs for the same template run one at a time and wait for
+    their template without taking a worker slot. At most `queue_size` jobs may
+    wait to start.
+    """
+
+    def __init__(self, workers: int = SERVER_WORKERS, queue_size: int = SERVER_QUEUE_SIZE,
+                 history: int = SERVER_JOB_HISTORY):
+        self._workers = max(1, workers)
+        self._queue_size = queue_size
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+        self._futures: Set["concurrent.futures.Future[None]"] = set()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._history = history
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="job-loop", daemon=True)
+
+    def start(self) -> "JobService":
+        self._loop_thread.start()
+        return self
+
+    def stop(self):
+        """Lets queued jobs finish, then closes the sessions and the event loop."""
+        with self._jobs_lock:
+            futures = list(self._futures)
+        concurrent.futures.wait(futures)
+        asyncio.run_coroutine_threadsafe(close_async_sessions(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def submit(self, spec: Dict[str, Any]) -> Job:
+        """Queues a job; raises queue.Full when the queue is at capacity."""
+        job = Job(spec)
+        with self._jobs_lock:
+            if self._queued >= self._queue_size:
+                raise queue.Full
+            self._queued += 1
+            self._jobs[job.id] = job
+            # Старые завершённые задания вытесняются, чтобы история не росла бесконечно
+            while len(self._jobs) > self._history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status in ("queued", "running"):
+                    break
+                del self._jobs[oldest_id]
+            future = asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        metrics.increment("server_jobs_submitted")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def _forget(self, future: "concurrent.futures.Future[None]"):
+        with self._jobs_lock:
+            self._futures.discard(future)
+
+    def _dequeue(self, job: Job, status: str):
+        with self._jobs_lock:
+            if job.status == "queued":
+                self._queued -= 1
+            job.status = status
+
+    @contextlib.asynccontextmanager
+    async def _worker_slot(self, job: Job):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._workers)
+        async with self._slots:
+            job.started_at = time.time()
+            self._dequeue(job, "running")
+            yield
+
+    async def _run(self, job: Job):
+        spec = job.spec
+        try:
+            job.run_id = await process_creation_request_async(
+                spec["request_text"], _inline_xml(spec), spec["template_id"], spec["template_name"],
+                field_samples=spec.get("field_samples"), run_id=spec.get("run_id") or job.id,
+                resume=bool(spec.get("resume")), slot=self._worker_slot(job)
+            )
+            self._dequeue(job, "completed")
+            metrics.increment("server_jobs_completed")
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            self._dequeue(job, "failed")
+            metrics.increment("server_jobs_failed")
+        finally:
+            job.finished_at = time.time()
+
+
+def _inline_xml(spec: Dict[str, Any]) -> Optional[bytes]:
+    """The job's XML is always parsed as a document, never opened as a server-side path."""
+    return spec["xml"].encode("utf-8") if "xml" in spec else None
+
+
+def _validate_spec(spec: Any) -> Dict[str, Any]:
+    if not isinstance(spec, dict):
+        raise ValueError("Job must be a JSON object.")
+    missing = [key for key in REQUIRED_JOB_KEYS if not spec.get(key)]
+    if missing:
+        raise ValueError(f"Job is missing required keys {missing}.")
+    if "xml" in spec:
+        if not isinstance(spec["xml"], str) or not spec["xml"].lstrip("\ufeff \t\r\n").startswith("<"):
+            raise ValueError("'xml' must be an XML document.")
+    elif "field_samples" in spec:
+        samples = spec["field_samples"]
+        if not isinstance(samples, dict) or not all(isinstance(values, list) for values in samples.values()):
+            raise ValueError("'field_samples' must map field names to lists of sample values.")
+    else:
+        raise ValueError("Job needs either 'xml' or 'field_samples'.")
+    return spec
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service: JobService
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send(self, status: int, body: Any, content_type: str = "application/json", headers: Dict[str, str] = None):
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "queued": self.service.queue_depth})
+        elif self.path == "/metrics":
+            self._send(200, metrics.to_prometheus(), "text/plain; version=0.0.4")
+        elif self.path.startswith("/jobs/"):
+            job = self.service.get(self.path[len("/jobs/"):])
+            if job is None:
+                self._send(404, {"error": "job not found"})
+            else:
+                self._send(200, job.to_dict())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send(413, {"error": "request body too large"})
+            self.close_connection = True
+            return
+        try:
+            spec = _validate_spec(json.loads(self.rfile.read(length) or b"null"))
+        except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        try:
+            job = self.service.submit(spec)
+        except queue.Full:
+            metrics.increment("server_jobs_rejected")
+            self._send(503, {"error": "job queue is full"}, headers={"Retry-After": "30"})
+            return
+        self._send(202, {"job_id": job.id, "status": job.status}, headers={"Location": f"/jobs/{job.id}"})
+
+
+def create_server(service: JobService, host: str = SERVER_HOST, port: int = SERVER_PORT) -> ThreadingHTTPServer:
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT):
+    service = JobService().start()
+    server = create_server(service, host, port)
+    logger.info(f"Serving on http://{host}:{server.server_address[1]} "
+                f"({SERVER_WORKERS} workers, queue of {SERVER_QUEUE_SIZE})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    serve()
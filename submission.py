@@ -0,0 +1,92 @@
+import asyncio
+import weakref
+from typing import List, Dict, Any, Set, Tuple
+import platform_api
+from config import logger
+from metrics import metrics
+from matching import match_key
+from planner import existing_attribute_keys
+
+
+class _ContainerState:
+    def __init__(self):
+        self.in_flight: Dict[str, "asyncio.Future[bool]"] = {}
+        self.completed: Set[str] = set()
+        self.stats = {"round_trips": 0, "skipped_completed": 0, "collapsed_in_flight": 0}
+
+
+class CreationSubmitter:
+    """
+    Submission stage in front of CreateProperty. Keeps, per container, the
+    aliases that are being created and those known to exist, and collapses
+    duplicates before they reach the network: an alias that already exists is
+    answered locally, a second request for an alias in flight shares the first
+    request's result. All creations share the keep-alive session and the
+    adaptive rate limiter of platform_api.
+    """
+
+    def __init__(self):
+        self._containers: Dict[str, _ContainerState] = {}
+
+    def _state(self, container_id: str) -> _ContainerState:
+        return self._containers.setdefault(container_id, _ContainerState())
+
+    def seed(self, container_id: str, existing_attributes: List[Dict[str, Any]]):
+        """
+        Replaces the completed set with a fresh ListAllProperties snapshot, so
+        attributes deleted on the platform are not skipped forever.
+        """
+        self._state(container_id).completed = existing_attribute_keys(existing_attributes)
+
+    def submit(self, attribute_json: Dict[str, Any]) -> Tuple["asyncio.Future[bool]", bool]:
+        """
+        Starts creating the attribute unless its alias is already covered.
+        Returns the future of the creation and whether it needs a new round-trip.
+        """
+        state = self._state(attribute_json['containerId'])
+        key = match_key(attribute_json['alias'])
+        if key in state.completed:
+            state.stats["skipped_completed"] += 1
+            metrics.increment("submission_skipped_completed")
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(True)
+            return future, False
+        if key in state.in_flight:
+            state.stats["collapsed_in_flight"] += 1
+            metrics.increment("submission_collapsed_in_flight")
+            return state.in_flight[key], False
+
+        state.stats["round_trips"] += 1
+        metrics.increment("submission_round_trips")
+        task = asyncio.ensure_future(platform_api.create_attribute_in_platform_async(attribute_json))
+        state.in_flight[key] = task
+
+        def finished(done: "asyncio.Future[bool]"):
+            state.in_flight.pop(key, None)
+            if not done.cancelled() and done.exception() is None and done.result():
+                state.completed.add(key)
+
+        task.add_done_callback(finished)
+        return task, True
+
+    def reset_stats(self, container_id: str):
+        """Starts a new reporting window for the container (runs per container are serialized)."""
+        self._state(container_id).stats = dict.fromkeys(self._state(container_id).stats, 0)
+
+    def stats(self, container_id: str) -> Dict[str, int]:
+        return dict(self._state(container_id).stats)
+
+    def log_summary(self, container_id: str):
+        stats = self.stats(container_id)
+        skipped = stats["skipped_completed"] + stats["collapsed_in_flight"]
+        logger.info(f"Submission for {container_id}: {stats['round_trips']} CreateProperty round-trip(s), "
+                    f"{skipped} duplicate(s) skipped locally ({stats['skipped_completed']} already existing, "
+                    f"{stats['collapsed_in_flight']} already in flight).")
+
+
+_submitters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, CreationSubmitter]" = weakref.WeakKeyDictionary()
+
+
+def get_submitter() -> CreationSubmitter:
+    """Returns the submitter of the running event loop; it lives as long as the loop."""
+    return _submitters.setdefault(asyncio.get_running_loop(), CreationSubmitter())
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_integration  # noqa: E402
+import orchestrator  # noqa: E402
+import platform_api  # noqa: E402
+from attribute_cache import TemplateAttributeCache  # noqa: E402
+from benchmarks.stubs import PlatformStub, OllamaStub  # noqa: E402
+from config import OLLAMA_MODEL  # noqa: E402
+from llm_pool import LLMBackend, LLMPool  # noqa: E402
+
+
+@pytest.fixture
+def platform_stub(monkeypatch):
+    stub = PlatformStub().start()
+    monkeypatch.setattr(platform_api, "PLATFORM_API_BASE_URL", stub.url)
+    monkeypatch.setattr(platform_api, "attribute_cache", TemplateAttributeCache(ttl_seconds=300, max_templates=16))
+    monkeypatch.setattr(orchestrator, "JOURNAL_DIR", "")
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def ollama_stub(monkeypatch):
+    """Factory: ollama_stub(**OllamaStub kwargs) starts a stand-in and routes the model calls to it."""
+    stubs = []
+
+    def start(**kwargs) -> OllamaStub:
+        stub = OllamaStub(**kwargs).start()
+        stubs.append(stub)
+        monkeypatch.setattr(ai_integration, "ollama_pool", LLMPool([LLMBackend(f"{stub.url}/api/generate", OLLAMA_MODEL)]))
+        monkeypatch.setattr(ai_integration, "ai_response_cache", None)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.stop()
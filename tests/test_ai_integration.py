@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import ai_integration
+from ai_cache import AIResponseCache
+from config import OLLAMA_MODEL
+from llm_pool import LLMBackend, LLMPool
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay, *args, **kwargs: real_sleep(0, *args, **kwargs))
+
+
+async def _collect(prompt: str):
+    return [item async for item in ai_integration.stream_ai_ollama_async(prompt, "oa.1")]
+
+
+def test_stream_without_array_is_retried_and_not_cached(ollama_stub, fast_retries, monkeypatch, tmp_path):
+    ollama = ollama_stub(responses=["I am sorry, I cannot produce that."])
+    monkeypatch.setattr(ai_integration, "ai_response_cache", AIResponseCache(str(tmp_path), 1024 * 1024))
+    with pytest.raises(RuntimeError):
+        asyncio.run(_collect("prompt"))
+    assert ollama.calls == 3
+    with pytest.raises(RuntimeError):
+        asyncio.run(_collect("prompt"))
+    assert ollama.calls == 6
+
+
+def test_truncated_stream_is_used_but_not_cached(ollama_stub, monkeypatch, tmp_path):
+    item = '{"containerId": "oa.0", "alias": "A", "type": "Decimal", "attributes": {"ObjectApp": "sln.2", "Name": "A"}}'
+    ollama = ollama_stub(responses=[f"[{item}, {{\"alias\": \"B\""])
+    monkeypatch.setattr(ai_integration, "ai_response_cache", AIResponseCache(str(tmp_path), 1024 * 1024))
+    assert [item["alias"] for item in asyncio.run(_collect("prompt"))] == ["A"]
+    assert [item["alias"] for item in asyncio.run(_collect("prompt"))] == ["A"]
+    assert ollama.calls == 2
+
+
+ITEM = '{"containerId": "oa.0", "alias": "A", "type": "Decimal", "attributes": {"ObjectApp": "sln.2", "Name": "A"}}'
+
+
+def test_answers_are_cached_under_the_model_that_gave_them(ollama_stub, monkeypatch, tmp_path):
+    ollama = ollama_stub(responses=[f"[{ITEM}]"])
+    monkeypatch.setattr(ai_integration, "ai_response_cache", AIResponseCache(str(tmp_path), 1024 * 1024))
+    monkeypatch.setattr(ai_integration, "ollama_pool", LLMPool([LLMBackend(f"{ollama.url}/api/generate", "weak")]))
+    asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))
+    asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))
+    assert ollama.calls == 2
+
+    monkeypatch.setattr(ai_integration, "ollama_pool", LLMPool([LLMBackend(f"{ollama.url}/api/generate", OLLAMA_MODEL)]))
+    asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))
+    assert [item["alias"] for item in asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))] == ["A"]
+    assert ollama.calls == 3
+
+
+def test_output_format_is_part_of_the_cache_key(ollama_stub, monkeypatch, tmp_path):
+    ollama = ollama_stub(responses=[f"[{ITEM}]"])
+    monkeypatch.setattr(ai_integration, "ai_response_cache", AIResponseCache(str(tmp_path), 1024 * 1024))
+    asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))
+    monkeypatch.setattr(ai_integration, "OLLAMA_FORMAT", "schema")
+    asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))
+    assert ollama.calls == 2
+
+
+def test_empty_array_quoted_in_prose_is_skipped_and_not_cached(ollama_stub, monkeypatch, tmp_path):
+    ollama = ollama_stub(responses=["Nothing is missing, so the answer is [].",
+                                    f"I would return [] if nothing were missing. Otherwise: [{ITEM}]"])
+    monkeypatch.setattr(ai_integration, "ai_response_cache", AIResponseCache(str(tmp_path), 1024 * 1024))
+    assert asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1")) == []
+    assert [item["alias"] for item in asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))] == ["A"]
+    assert [item["alias"] for item in asyncio.run(ai_integration.query_ai_ollama_async("prompt", "oa.1"))] == ["A"]
+    assert ollama.calls == 2
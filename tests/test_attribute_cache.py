@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+import attribute_cache
+from attribute_cache import TemplateAttributeCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(attribute_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TemplateAttributeCache(ttl_seconds=10)
+    cache.put("oa.1", [{"alias": "A"}])
+    clock[0] += 9
+    assert cache.get("oa.1") == [{"alias": "A"}]
+    clock[0] += 1
+    assert cache.get("oa.1") is None
+
+
+def test_least_recently_used_template_is_evicted():
+    cache = TemplateAttributeCache(max_templates=2)
+    cache.put("oa.1", [])
+    cache.put("oa.2", [])
+    cache.get("oa.1")
+    cache.put("oa.3", [])
+    assert cache.get("oa.1") == []
+    assert cache.get("oa.2") is None
+    assert cache.get("oa.3") == []
+
+
+def test_record_created_extends_only_fresh_entries(clock):
+    cache = TemplateAttributeCache(ttl_seconds=10)
+    cache.record_created("oa.1", {"alias": "A"})
+    assert cache.get("oa.1") is None
+
+    cache.put("oa.1", [{"alias": "A"}])
+    cached = cache.get("oa.1")
+    cache.record_created("oa.1", {"alias": "B"})
+    assert cache.get("oa.1") == [{"alias": "A"}, {"alias": "B"}]
+    assert cached == [{"alias": "A"}]
+
+    clock[0] += 10
+    cache.record_created("oa.1", {"alias": "C"})
+    assert cache.get("oa.1") is None
+
+
+def test_invalidate_drops_the_entry(tmp_path):
+    cache = TemplateAttributeCache(db_path=str(tmp_path / "cache.sqlite"))
+    cache.put("oa.1", [{"alias": "A"}])
+    cache.invalidate("oa.1")
+    assert cache.get("oa.1") is None
+    assert TemplateAttributeCache(db_path=str(tmp_path / "cache.sqlite")).get("oa.1") is None
+
+
+def test_sqlite_entries_survive_a_restart_and_grow_by_one_row(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TemplateAttributeCache(db_path=path)
+    cache.put("oa.1", [{"alias": "A"}, {"alias": "Б"}])
+    cache.record_created("oa.1", {"alias": "C"})
+
+    assert TemplateAttributeCache(db_path=path).get("oa.1") == [{"alias": "A"}, {"alias": "Б"}, {"alias": "C"}]
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM cached_attributes").fetchone() == (3,)
@@ -0,0 +1,60 @@
+import json
+
+from batch import load_jobs, merge_jobs, run_batch
+
+JOB = {"request_text": "r", "template_id": "oa.1", "template_name": "T"}
+
+
+def _manifest(tmp_path, jobs):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text("\n".join(job if isinstance(job, str) else json.dumps(job) for job in jobs), encoding="utf-8")
+    return str(path)
+
+
+def test_load_jobs_reports_jobs_it_cannot_load(tmp_path):
+    (tmp_path / "a.xml").write_text("<root><A>1</A></root>", encoding="utf-8")
+    path = _manifest(tmp_path, [
+        dict(JOB, xml_path="a.xml"),
+        dict(JOB, template_id="oa.2", xml_path="missing.xml"),
+        dict(JOB, template_id="oa.3"),
+        {"request_text": "r", "xml": "<root/>"},
+        "{not json",
+    ])
+    skipped = []
+    jobs = load_jobs(path, skipped)
+    assert [job["template_id"] for job in jobs] == ["oa.1"]
+    assert str(jobs[0]["xml_source"]).endswith("a.xml")
+    assert skipped == ["oa.2", "oa.3", f"{path}:4", f"{path}:5"]
+
+
+def test_load_jobs_from_a_directory(tmp_path):
+    (tmp_path / "one.json").write_text(json.dumps(dict(JOB, xml="<root><A>1</A></root>")), encoding="utf-8")
+    (tmp_path / "many.jsonl").write_text(json.dumps(dict(JOB, template_id="oa.2", xml="<root/>")), encoding="utf-8")
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    skipped = []
+    assert [job["template_id"] for job in load_jobs(str(tmp_path), skipped)] == ["oa.2", "oa.1"]
+    assert skipped == [str(tmp_path / "broken.json")]
+
+
+def test_merge_jobs_unions_fields_per_template_and_skips_invalid_xml():
+    jobs = [
+        dict(JOB, xml_source="<root><A>1</A></root>"),
+        dict(JOB, request_text="s", xml_source="<root><A>2</A><B>3</B></root>"),
+        dict(JOB, template_id="oa.2", xml_source="<root><A>1</root>"),
+    ]
+    skipped = []
+    groups = merge_jobs(jobs, skipped)
+    assert len(groups) == 1
+    assert groups[0]["request_texts"] == ["r", "s"]
+    assert groups[0]["field_samples"] == {"A": ["1", "2"], "B": ["3"]}
+    assert groups[0]["job_count"] == 2
+    assert skipped == ["oa.2"]
+
+
+def test_skipped_jobs_fail_the_batch(tmp_path, platform_stub, ollama_stub):
+    ollama_stub()
+    path = _manifest(tmp_path, [
+        dict(JOB, xml="<root><D>2023-12-07</D><C>RUB</C></root>"),
+        dict(JOB, template_id="oa.2", xml_path="missing.xml"),
+    ])
+    assert run_batch(path) == {"oa.1": True, "oa.2": False}
@@ -0,0 +1,33 @@
+from journal import JournalState, RunJournal
+
+
+def test_journal_state_tracks_outstanding_items():
+    state = JournalState()
+    for event in [
+        {"event": "run_started", "template_id": "oa.1"},
+        {"event": "model_output", "item": {"alias": "A"}},
+        {"event": "model_output", "item": {"alias": "B"}},
+        {"event": "create_result", "alias": "A", "created": True},
+        {"event": "create_result", "alias": "B", "created": False},
+    ]:
+        state.apply(event)
+    assert state.template_id == "oa.1"
+    assert state.outstanding() == [{"alias": "B"}]
+    assert state.failed == {"B"}
+    assert not state.finished
+
+    state.apply({"event": "run_finished", "status": "completed"})
+    assert state.finished
+
+
+def test_replay_ignores_a_torn_last_line(tmp_path):
+    journal = RunJournal(str(tmp_path), "run-1")
+    journal.record("run_started", template_id="oa.1")
+    journal.record("model_output", item={"alias": "A"})
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"event": "create_res')
+
+    state = RunJournal(str(tmp_path), "run-1").replay()
+    assert state.template_id == "oa.1"
+    assert state.outstanding() == [{"alias": "A"}]
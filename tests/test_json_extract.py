@@ -0,0 +1,51 @@
+import pytest
+
+from json_extract import JsonArrayStreamParser, extract_json_array, scan_json_array
+
+
+def test_extract_plain_array():
+    assert extract_json_array('[{"alias": "A"}, {"alias": "B"}]') == [{"alias": "A"}, {"alias": "B"}]
+
+
+def test_extract_skips_prose_and_code_fences():
+    text = 'Here are the attributes [see below]:\n```json\n[{"alias": "A"}]\n```\nDone.'
+    assert extract_json_array(text) == [{"alias": "A"}]
+
+
+def test_extract_drops_malformed_element():
+    assert extract_json_array('[{"alias": "A"}, {"alias": B}, {"alias": "C"}]') == [{"alias": "A"}, {"alias": "C"}]
+
+
+def test_extract_truncated_array_keeps_completed_elements():
+    assert extract_json_array('[{"alias": "A"}, {"alias": "B", "ty') == [{"alias": "A"}]
+
+
+def test_extract_unwraps_objects():
+    assert extract_json_array('{"attributes": [{"alias": "A"}]}') == [{"alias": "A"}]
+    assert extract_json_array('{"alias": "A", "type": "String"}') == [{"alias": "A", "type": "String"}]
+
+
+def test_empty_array_in_prose_does_not_end_the_scan():
+    text = 'If nothing is missing I would return []. Otherwise: [{"alias": "A"}]'
+    assert scan_json_array(text) == ([{"alias": "A"}], True)
+
+
+def test_only_a_bare_empty_array_is_complete():
+    assert scan_json_array(" [] ") == ([], True)
+    assert scan_json_array("Nothing to add: []") == ([], False)
+    assert scan_json_array("[] and [") == ([], False)
+
+
+def test_extract_without_array_raises():
+    with pytest.raises(ValueError):
+        extract_json_array("I cannot help with that.")
+
+
+def test_stream_parser_emits_elements_across_chunks():
+    parser = JsonArrayStreamParser()
+    text = 'Sure! [{"alias": "A", "note": "a ] in a string"}, {"alias": "B"}] trailing'
+    elements = []
+    for start in range(0, len(text), 3):
+        elements.extend(parser.feed(text[start:start + 3]))
+    assert elements == [{"alias": "A", "note": "a ] in a string"}, {"alias": "B"}]
+    assert parser.done
@@ -0,0 +1,52 @@
+import asyncio
+
+from llm_pool import LLMBackend, LLMPool
+
+
+def _pool(hedge_after=None) -> LLMPool:
+    return LLMPool([LLMBackend("http://a", "m"), LLMBackend("http://b", "m")], failure_threshold=2,
+                   cooldown_seconds=60, hedge_after=hedge_after)
+
+
+def test_select_prefers_least_loaded_and_skips_open_circuits():
+    pool = _pool()
+    first = pool.select()
+    second = pool.select()
+    assert first is not second
+    pool.release(first, True, 0.1)
+    pool.release(second, False, 0.1)
+    pool.release(pool.select(exclude=[first]), False, 0.1)
+    assert second.open_until > 0
+    assert pool.select() is first
+
+
+def test_hedged_loser_is_cancelled():
+    pool = _pool(hedge_after=0.01)
+    calls = []
+
+    async def generate(backend):
+        calls.append(backend.url)
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return backend.url
+
+    result = asyncio.run(pool.call_async(generate))
+    assert result == calls[1]
+    assert [backend.in_flight for backend in pool.backends] == [0, 0]
+
+
+def test_cancelled_caller_releases_every_backend():
+    pool = _pool(hedge_after=0.01)
+
+    async def generate(backend):
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.ensure_future(pool.call_async(generate))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert [backend.in_flight for backend in pool.backends] == [0, 0]
+    assert all(backend.consecutive_failures == 0 and backend.latency_ewma is None for backend in pool.backends)
@@ -0,0 +1,66 @@
+import pytest
+
+from matching import AttributeMatchIndex, match_key
+from planner import plan_missing_fields
+
+
+def _attr(alias, name=None):
+    return {"alias": alias, "attributes": {"Name": name or alias}, "type": "String"}
+
+
+@pytest.mark.parametrize("value", ["SUMMAWITHNDS", "SummaWithNds", "summa_with_nds", "Summa-With NDS"])
+def test_match_key_ignores_case_and_separators(value):
+    assert match_key(value) == "summawithnds"
+
+
+def test_match_key_transliterates_but_does_not_translate():
+    assert match_key("Сумма") == match_key("SUMMA")
+    assert match_key("DATA") != match_key("DATE")
+    assert match_key("Имя") != match_key("NAME")
+
+
+def test_covers_only_exact_keys():
+    index = AttributeMatchIndex([_attr("summa_with_nds"), _attr("DATE1"), _attr("inn", "Номер")])
+    assert index.covers("SUMMAWITHNDS")
+    assert index.covers("SummaWithNds")
+    assert index.covers("NOMER")
+    assert not index.covers("DATA")
+    assert not index.covers("DATE3")
+    assert not index.covers("NUMBER")
+
+
+def test_planner_keeps_similar_fields():
+    existing = [_attr("DATE"), _attr("DATE1"), _attr("SUMMA_WITH_NDS")]
+    missing = plan_missing_fields({"DATA": "x", "DATE3": "x", "SummaWithNds": "1", "DATE1": "x"}, existing)
+    assert list(missing) == ["DATA", "DATE3"]
+
+
+def test_best_match_scores_similar_names_below_exact():
+    index = AttributeMatchIndex([_attr("DATE1"), _attr("NAME"), _attr("CURRENCY")])
+    described, score = index.best_match("DATE3")
+    assert described["alias"] == "DATE1" and score == pytest.approx(0.9)
+    described, score = index.best_match("Имя")
+    assert described["alias"] == "NAME" and 0.9 < score < 1.0
+    assert index.best_match("date1") == ({"alias": "DATE1", "name": "DATE1", "type": "String"}, 1.0)
+    assert index.best_match("QWERTY") is None
+
+
+def test_a_short_display_name_does_not_inflate_the_score():
+    long_name = AttributeMatchIndex([_attr("CONTRACT_DATE")])
+    short_name = AttributeMatchIndex([_attr("CONTRACT_DATE", "Д")])
+    assert short_name.best_match("CONTRACT_NUMBER") == (
+        {"alias": "CONTRACT_DATE", "name": "Д", "type": "String"}, long_name.best_match("CONTRACT_NUMBER")[1])
+    assert long_name.best_match("CONTRACT_NUMBER")[1] < 0.6
+
+
+def test_top_k_ranks_by_the_better_of_alias_and_name():
+    index = AttributeMatchIndex([_attr("CONTRACT_DATE", "Д"), _attr("CONTRACT_NUM", "Номер договора")])
+    assert [described["alias"] for described, _ in index.top_k(["CONTRACT_NUMBER"])] == ["CONTRACT_NUM", "CONTRACT_DATE"]
+
+
+def test_added_attributes_are_matched_like_initial_ones():
+    index = AttributeMatchIndex([_attr("DATE1")])
+    index.add({"containerId": "oa.1", "alias": "SUMMA_WITH_NDS", "type": "Decimal", "attributes": {"Name": "Сумма с НДС"}})
+    assert len(index) == 2
+    assert index.covers("SummaWithNds")
+    assert index.best_match("SUMMA_NDS")[0]["alias"] == "SUMMA_WITH_NDS"
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import generate_xml
+from matching import AttributeMatchIndex
+from orchestrator import process_creation_request
+
+
+def test_creates_every_field(platform_stub, ollama_stub):
+    ollama = ollama_stub()
+    process_creation_request("r", generate_xml(30, 3), "oa.1", "T")
+    assert sorted(platform_stub.attributes["oa.1"]) == sorted(f"FIELD{index}" for index in range(30))
+    assert ollama.calls <= 30
+
+
+def test_rate_limited_creations_are_retried(platform_stub, ollama_stub, monkeypatch):
+    monkeypatch.setattr("platform_api._rate_limit_delay", lambda base_delay, attempt: 0.01)
+    platform_stub.rate_limit_rate = 0.3
+    ollama_stub()
+    process_creation_request("r", generate_xml(20), "oa.2", "T")
+    assert len(platform_stub.attributes["oa.2"]) == 20
+    assert platform_stub.create_calls > 20
+
+
+def _ambiguous_xml(field_count: int) -> str:
+    return "<root>" + "".join(f"<F{index}>{index + 10}</F{index}>" for index in range(field_count)) + "</root>"
+
+
+def _item(alias: str) -> str:
+    return ('[{"containerId": "oa.0", "alias": "%s", "type": "Decimal", '
+            '"attributes": {"ObjectApp": "sln.2", "Name": "%s"}}]' % (alias, alias))
+
+
+def test_fields_the_model_never_covers_are_given_up(platform_stub, ollama_stub, monkeypatch):
+    monkeypatch.setattr("orchestrator.AI_CHUNK_SIZE", 5)
+    monkeypatch.setattr("orchestrator.AI_FIELD_MAX_ATTEMPTS", 2)
+    ollama = ollama_stub(responses=[_item(f"UNRELATED{index}") for index in range(1000)])
+    process_creation_request("r", _ambiguous_xml(50), "oa.3", "T")
+    assert ollama.calls == 2 * 10
+
+
+def test_chunks_that_only_repeat_existing_attributes_are_not_asked_again(platform_stub, ollama_stub, monkeypatch):
+    monkeypatch.setattr("orchestrator.AI_CHUNK_SIZE", 5)
+    ollama = ollama_stub(responses=[_item("SAME")])
+    process_creation_request("r", _ambiguous_xml(50), "oa.4", "T")
+    assert ollama.calls <= 11
+
+
+def test_resume_without_a_journal_fails(platform_stub, ollama_stub, monkeypatch, tmp_path):
+    ollama = ollama_stub()
+    with pytest.raises(ValueError, match="JOURNAL_DIR is not set"):
+        process_creation_request("r", generate_xml(5), "oa.5", "T", run_id="run-1", resume=True)
+    monkeypatch.setattr("orchestrator.JOURNAL_DIR", str(tmp_path))
+    with pytest.raises(ValueError, match="no journal"):
+        process_creation_request("r", generate_xml(5), "oa.5", "T", run_id="run-typo", resume=True)
+    assert ollama.calls == 0 and platform_stub.create_calls == 0
+
+
+def test_resuming_a_completed_run_does_nothing(platform_stub, ollama_stub, monkeypatch, tmp_path):
+    monkeypatch.setattr("orchestrator.JOURNAL_DIR", str(tmp_path))
+    ollama = ollama_stub()
+    process_creation_request("r", _ambiguous_xml(5), "oa.6", "T", run_id="run-2")
+    calls, create_calls = ollama.calls, platform_stub.create_calls
+    process_creation_request("r", None, "oa.6", "T", run_id="run-2", resume=True)
+    assert (ollama.calls, platform_stub.create_calls) == (calls, create_calls)
+
+
+def test_resume_creates_journaled_model_output_without_the_model(platform_stub, ollama_stub, monkeypatch, tmp_path):
+    monkeypatch.setattr("orchestrator.JOURNAL_DIR", str(tmp_path))
+    item = json.loads(_item("F0"))[0]
+    events = [
+        {"event": "run_started", "template_id": "oa.7"},
+        {"event": "schema", "field_samples": {"F0": ["10"]}},
+        {"event": "model_output", "item": dict(item, containerId="oa.7")},
+    ]
+    (tmp_path / "run-3.jsonl").write_text("".join(json.dumps(event) + "\n" for event in events), encoding="utf-8")
+    ollama = ollama_stub()
+    process_creation_request("r", None, "oa.7", "T", run_id="run-3", resume=True)
+    assert list(platform_stub.attributes["oa.7"]) == ["F0"]
+    assert ollama.calls == 0
+
+
+def test_matching_index_is_built_once_per_wave(platform_stub, ollama_stub, monkeypatch):
+    builds = []
+    real_init = AttributeMatchIndex.__init__
+
+    def counting_init(self, *args, **kwargs):
+        builds.append(1)
+        real_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(AttributeMatchIndex, "__init__", counting_init)
+    monkeypatch.setattr("orchestrator.AI_CHUNK_SIZE", 5)
+    ollama = ollama_stub()
+    process_creation_request("r", _ambiguous_xml(30), "oa.8", "T")
+    assert ollama.calls == 6
+    assert len(builds) <= 3
+
+
+def test_fields_similar_to_existing_attributes_are_left_to_the_model(platform_stub, ollama_stub, monkeypatch):
+    platform_stub.attributes["oa.9"] = {
+        "NAME": {"containerId": "oa.9", "alias": "NAME", "type": "String", "attributes": {"Name": "NAME"}},
+    }
+    ollama = ollama_stub(responses=["[]"])
+    prompts = []
+    real_next_response = ollama.next_response
+
+    def recording_next_response(prompt):
+        prompts.append(prompt)
+        return real_next_response(prompt)
+
+    monkeypatch.setattr(ollama, "next_response", recording_next_response)
+    process_creation_request("r", "<root><Имя>Иван</Имя><D>2023-12-07</D></root>", "oa.9", "T")
+    assert sorted(platform_stub.attributes["oa.9"]) == ["D", "NAME"]
+    assert ollama.calls == 1
+    assert '"similar_existing_attribute": "NAME"' in prompts[0]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from platform_api import ALREADY_EXISTS, FAILED, RATE_LIMITED, AsyncAdaptiveRateLimiter, _classify_create_response
+
+
+def test_rate_limiter_halves_on_rate_limit_and_grows_after_successes():
+    limiter = AsyncAdaptiveRateLimiter(max_limit=8, min_limit=1, increase_after=2)
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    assert limiter.limit == 2
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.limit == 4
+    for _ in range(10):
+        limiter.on_rate_limited()
+    assert limiter.limit == 1
+
+
+def test_rate_limiter_halves_once_per_wave_of_rate_limits():
+    limiter = AsyncAdaptiveRateLimiter(max_limit=8, min_limit=1)
+    started = [limiter.generation for _ in range(8)]
+    for generation in started:
+        limiter.on_rate_limited(generation)
+    assert limiter.limit == 4
+    limiter.on_rate_limited(limiter.generation)
+    assert limiter.limit == 2
+
+
+def test_rate_limiter_bounds_concurrency():
+    limiter = AsyncAdaptiveRateLimiter(max_limit=3, min_limit=1)
+    running = peak = 0
+
+    async def work():
+        nonlocal running, peak
+        async with limiter:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(10)))
+
+    asyncio.run(main())
+    assert peak == 3
+
+
+@pytest.mark.parametrize("body, outcome", [
+    ('{"alias": "Атрибут уже существует"}', ALREADY_EXISTS),
+    ('{"alias": ["Атрибут уже существует"]}', ALREADY_EXISTS),
+    ('{"alias": "Запросы отправляются слишком часто"}', RATE_LIMITED),
+    ('{"alias": null}', FAILED),
+    ('[1, 2]', FAILED),
+    ('', FAILED),
+])
+def test_classify_server_errors(body, outcome):
+    assert _classify_create_response(500, body, {"alias": "A", "containerId": "oa.1"})[0] == outcome
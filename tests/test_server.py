@@ -0,0 +1,51 @@
+import queue
+import time
+
+import pytest
+
+from server import JobService, _validate_spec
+
+SPEC = {"request_text": "r", "template_name": "T"}
+
+
+def _wait(service: JobService, jobs, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while any(service.get(job.id).status in ("queued", "running") for job in jobs):
+        assert time.monotonic() < deadline, "jobs did not finish"
+        time.sleep(0.02)
+
+
+@pytest.mark.parametrize("spec", [
+    dict(SPEC, template_id="oa.1", xml="/etc/hostname"),
+    dict(SPEC, template_id="oa.1", xml=""),
+    dict(SPEC, template_id="oa.1", xml=["<root/>"]),
+    dict(SPEC, template_id="oa.1", field_samples=["A"]),
+    dict(SPEC, template_id="oa.1"),
+    dict(SPEC, xml="<root/>"),
+])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        _validate_spec(spec)
+
+
+def test_full_queue_is_rejected():
+    service = JobService(workers=1, queue_size=0)
+    with pytest.raises(queue.Full):
+        service.submit(dict(SPEC, template_id="oa.1", xml="<root/>"))
+
+
+def test_jobs_for_a_busy_template_do_not_block_other_templates(platform_stub, ollama_stub):
+    ollama_stub(delay=0.3)
+    service = JobService(workers=2, queue_size=10).start()
+    try:
+        xml = "<root><A>20</A></root>"
+        first = service.submit(dict(SPEC, template_id="oa.1", xml=xml))
+        second = service.submit(dict(SPEC, template_id="oa.1", xml=xml.replace("A>", "B>")))
+        other = service.submit(dict(SPEC, template_id="oa.2", xml="<root><D>2023-12-07</D><C>RUB</C></root>"))
+        _wait(service, [first, second, other])
+    finally:
+        service.stop()
+    assert [job.status for job in (first, second, other)] == ["completed"] * 3
+    assert other.finished_at < first.finished_at
+    assert second.started_at >= first.finished_at
+    assert sorted(platform_stub.attributes["oa.1"]) == ["A", "B"]
@@ -0,0 +1,24 @@
+import pytest
+
+from type_inference import classify_value, infer_attributes
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2023-12-07 12:00:00.000000000", ("datetime", 0)),
+    ("07.12.2023", ("datetime", 0)),
+    ("1491840000.00", ("decimal", 2)),
+    ("20", ("integer", 0)),
+    ("0000000100000000000348008", ("code", 0)),
+    ("01", ("code", 0)),
+    ("RUB", ("text", 0)),
+    ("  ", (None, 0)),
+    (None, (None, 0)),
+])
+def test_classify_value(value, expected):
+    assert classify_value(value) == expected
+
+
+def test_infer_attributes_leaves_ambiguous_integers_to_the_model():
+    payloads, ambiguous = infer_attributes({"DATE1": ["2023-12-07"], "NDS": ["20"], "CURRENCY": ["RUB"]}, "oa.1")
+    assert {payload["alias"]: payload["type"] for payload in payloads} == {"DATE1": "DateTime", "CURRENCY": "String"}
+    assert list(ambiguous) == ["NDS"]
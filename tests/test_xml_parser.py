@@ -0,0 +1,37 @@
+import pathlib
+
+import pytest
+
+from xml_parser import parse_xml_fields, parse_xml_schema
+
+
+def test_flat_document():
+    assert parse_xml_fields("<root><NDS>20</NDS><CURRENCY>RUB</CURRENCY><EMPTY/></root>") == {
+        "NDS": "20", "CURRENCY": "RUB", "EMPTY": "",
+    }
+
+
+def test_wrapped_records_are_named_below_the_record():
+    xml = ("<export><records>"
+           "<record><A>1</A><addr><city>X</city></addr></record>"
+           "<record><A>2</A><B>3</B></record>"
+           "</records></export>")
+    assert parse_xml_schema(xml) == {"A": ["1", "2"], "addr_city": ["X"], "B": ["3"]}
+
+
+def test_samples_are_bounded():
+    xml = "<root>" + "".join(f"<record><A>{index}</A></record>" for index in range(100)) + "</root>"
+    assert len(parse_xml_schema(xml, max_samples=3)["A"]) == 3
+
+
+def test_bom_and_path_sources(tmp_path):
+    assert parse_xml_fields("﻿<root><A>1</A></root>") == {"A": "1"}
+    path = tmp_path / "export.xml"
+    path.write_text("<root><A>1</A></root>", encoding="utf-8")
+    assert parse_xml_fields(pathlib.Path(path)) == {"A": "1"}
+
+
+@pytest.mark.parametrize("text", ["", "not xml", "/etc/hostname", "<root><A>1</root>"])
+def test_invalid_xml_raises_value_error(text):
+    with pytest.raises(ValueError, match="Invalid XML format provided."):
+        parse_xml_schema(text)
@@ -0,0 +1,112 @@
+import re
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple, Union
+from config import TYPE_INFERENCE_MIN_CONFIDENCE, logger
+
+_DATETIME_RE = re.compile(
+    r"^(\d{4}-\d{2}-\d{2}|\d{2}\.\d{2}\.\d{4})"
+    r"([ T]\d{2}:\d{2}(:\d{2}([.,]\d+)?)?)?"
+    r"(Z|[+-]\d{2}:?\d{2})?$"
+)
+_DECIMAL_RE = re.compile(r"^[+-]?\d+[.,](\d+)$")
+_INTEGER_RE = re.compile(r"^[+-]?\d+$")
+_HAS_LETTER_RE = re.compile(r"[^\W\d_]", re.UNICODE)
+
+# Базовая уверенность для каждого вида значения
+_KIND_CONFIDENCE = {
+    "datetime": 0.95,
+    "decimal": 0.9,
+    "text": 0.9,
+    "code": 0.85,
+    "integer": 0.6,  # "20" или "1010" может быть и числом, и кодом — решает модель
+}
+
+
+def classify_value(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """Returns the kind of a single sample value and its number of decimal places."""
+    if value is None:
+        return None, 0
+    value = str(value).strip()
+    if not value:
+        return None, 0
+    if _DATETIME_RE.match(value):
+        return "datetime", 0
+    match = _DECIMAL_RE.match(value)
+    if match:
+        return "decimal", len(match.group(1))
+    if _INTEGER_RE.match(value):
+        digits = value.lstrip("+-")
+        # Ведущие нули и очень длинные числа — это идентификаторы (SAP-коды), а не суммы
+        if (len(digits) > 1 and digits.startswith("0")) or len(digits) > 15:
+            return "code", 0
+        return "integer", 0
+    if _HAS_LETTER_RE.search(value):
+        return "text", 0
+    return "code", 0
+
+
+def infer_field_type(samples: List[str]) -> Tuple[Dict[str, Any], float]:
+    """
+    Infers the Platform API type of a field from its sample values.
+    Returns the type description (type, Format / DecimalPlaces) and a confidence in [0, 1].
+    """
+    kinds = Counter()
+    decimal_places = 0
+    for sample in samples:
+        kind, places = classify_value(sample)
+        if kind is None:
+            continue
+        kinds[kind] += 1
+        decimal_places = max(decimal_places, places)
+
+    if not kinds:
+        return {"type": "String", "Format": "PlainText"}, 0.0
+
+    total = sum(kinds.values())
+    # Целые и дробные значения в одном поле — это дробное поле
+    if "decimal" in kinds and "integer" in kinds:
+        kinds["decimal"] += kinds.pop("integer")
+    if "code" in kinds and "integer" in kinds:
+        kinds["code"] += kinds.pop("integer")
+
+    kind, count = kinds.most_common(1)[0]
+    confidence = _KIND_CONFIDENCE[kind] * count / total
+
+    if kind == "datetime":
+        return {"type": "DateTime", "Format": "DateISO"}, confidence
+    if kind in ("decimal", "integer"):
+        return {"type": "Decimal", "DecimalPlaces": decimal_places}, confidence
+    return {"type": "String", "Format": "PlainText"}, confidence
+
+
+def build_attribute_payload(field_name: str, type_info: Dict[str, Any], template_id: str, object_app: str = "sln.2") -> Dict[str, Any]:
+    """Builds a complete CreateProperty payload for an XML field."""
+    attributes = {"ObjectApp": object_app, "Name": field_name}
+    attributes.update({key: value for key, value in type_info.items() if key != "type"})
+    return {
+        "containerId": template_id,
+        "alias": field_name,
+        "type": type_info["type"],
+        "attributes": attributes,
+    }
+
+
+def infer_attributes(xml_fields: Dict[str, Union[str, List[str]]], template_id: str,
+                     min_confidence: float = TYPE_INFERENCE_MIN_CONFIDENCE) -> Tuple[List[Dict[str, Any]], Dict[str, Union[str, List[str]]]]:
+    """
+    Splits fields into payloads that can be created without the model and
+    ambiguous fields that still have to go through the LLM.
+    Field values may be a single example or a list of samples.
+    """
+    payloads = []
+    ambiguous = {}
+    for field_name, values in xml_fields.items():
+        samples = values if isinstance(values, list) else [values]
+        type_info, confidence = infer_field_type(samples)
+        if confidence >= min_confidence:
+            logger.debug(f"Inferred {field_name} as {type_info['type']} (confidence {confidence:.2f})")
+            payloads.append(build_attribute_payload(field_name, type_info, template_id))
+        else:
+            ambiguous[field_name] = values
+    logger.info(f"Type inference: {len(payloads)} field(s) resolved locally, {len(ambiguous)} left for the AI.")
+    return payloads, ambiguous
@@ -1,21 +1,129 @@
 import xml.etree.ElementTree as ET
+import functools
+import io
 import json
-from typing import Dict, List, Any
-from config import logger
+import os
+import random
+from typing import Dict, List, Any, IO, Optional, Set, Tuple, Union
+from config import (
+    XML_MAX_SAMPLES, OLLAMA_NUM_CTX, PROMPT_RESPONSE_RESERVE_TOKENS, AI_CHUNK_SIZE, MATCH_DUPLICATE_SCORE, logger
+)
+from metrics import timed
+from matching import AttributeMatchIndex, describe_existing_attribute
+
+# str и bytes — текст XML, os.PathLike — путь к файлу, иначе — открытый бинарный поток
+XmlSource = Union[str, bytes, os.PathLike, IO]
+
+
+def _open_xml_source(source: XmlSource) -> Union[str, IO]:
+    """
+    Inline XML (str or bytes) is wrapped into a stream; a path must be given as
+    os.PathLike, so arbitrary strings are never opened as files.
+    """
+    if isinstance(source, str):
+        return io.BytesIO(source.lstrip("\ufeff").encode("utf-8"))
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    return source
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _field_names(leaf_paths: List[Tuple[str, ...]], repeating: Set[Tuple[str, ...]]) -> Dict[Tuple[str, ...], str]:
+    """
+    Names every leaf by its path below the record — the outermost element that
+    repeats under its parent — joined with '_', so repeated records collapse
+    into one field set whatever wrappers surround them. Leaves outside any
+    record are named below the deepest ancestor they share.
+    """
+    names = {}
+    loose = []
+    for path in leaf_paths:
+        record = next((depth for depth in range(1, len(path) - 1) if path[:depth + 1] in repeating), None)
+        if record is None:
+            loose.append(path)
+        else:
+            names[path] = "_".join(path[record + 1:])
+    if loose:
+        shared = os.path.commonprefix([path[:-1] for path in loose])
+        for path in loose:
+            names[path] = "_".join(path[max(1, len(shared)):])
+    return names
+
+
+@timed("parse_xml_fields")
+def parse_xml_schema(source: XmlSource, max_samples: int = XML_MAX_SAMPLES) -> Dict[str, List[str]]:
+    """
+    Streams an XML document (XML text, os.PathLike path or binary stream) with
+    iterparse and returns every leaf field with a bounded reservoir of sample
+    values. Every element is detached from its parent as soon as it closes, so
+    memory stays flat for large exports at any nesting depth.
+    """
+    rng = random.Random(0)
+    samples: Dict[Tuple[str, ...], List[str]] = {}
+    seen: Dict[Tuple[str, ...], int] = {}
+    repeating: Set[Tuple[str, ...]] = set()
+    path: List[str] = []
+    # Для каждого открытого элемента: сам элемент, были ли у него дочерние элементы, счётчик тегов детей
+    open_elements: List[Tuple[ET.Element, List[bool], Dict[str, int]]] = []
 
-def parse_xml_fields(xml_data: str) -> Dict[str, str]:
-    """Parses the XML string and extracts field names and example values."""
     try:
-        root = ET.fromstring(xml_data)
-        fields = {}
-        for child in root:
-            fields[child.tag] = child.text if child.text else ""
-        logger.info(f"Parsed {len(fields)} fields from XML.")
-        return fields
+        for event, elem in ET.iterparse(_open_xml_source(source), events=("start", "end")):
+            if event == "start":
+                if open_elements:
+                    open_elements[-1][1][0] = True
+                path.append(_local_name(elem.tag))
+                open_elements.append((elem, [False], {}))
+                continue
+
+            _, has_children, _ = open_elements.pop()
+            key = tuple(path)
+            if open_elements and not has_children[0]:
+                reservoir = samples.setdefault(key, [])
+                value = elem.text or ""
+                if value.strip():
+                    # Reservoir sampling: каждое значение попадает в выборку с равной вероятностью
+                    seen[key] = seen.get(key, 0) + 1
+                    if len(reservoir) < max_samples:
+                        reservoir.append(value)
+                    else:
+                        slot = rng.randrange(seen[key])
+                        if slot < max_samples:
+                            reservoir[slot] = value
+            if open_elements:
+                parent, _, child_tags = open_elements[-1]
+                child_tags[path[-1]] = child_tags.get(path[-1], 0) + 1
+                if has_children[0] and child_tags[path[-1]] > 1:
+                    repeating.add(key)
+                # Обработанный элемент удаляется из родителя на любой глубине
+                parent.remove(elem)
+            path.pop()
     except ET.ParseError as e:
         logger.error(f"Error parsing XML data: {e}")
         raise ValueError("Invalid XML format provided.")
 
+    names = _field_names(list(samples), repeating)
+    fields: Dict[str, List[str]] = {}
+    for key, values in samples.items():
+        merged = fields.setdefault(names[key], [])
+        merged.extend(values[:max_samples - len(merged)])
+    logger.info(f"Parsed {len(fields)} fields from XML.")
+    return fields
+
+
+def representative_values(schema: Dict[str, List[str]]) -> Dict[str, str]:
+    """Picks one example value per field (empty string if the field was always empty)."""
+    return {name: values[0] if values else "" for name, values in schema.items()}
+
+
+def parse_xml_fields(xml_data: XmlSource) -> Dict[str, str]:
+    """Parses the XML (text, path or stream) and extracts field names and example values."""
+    return representative_values(parse_xml_schema(xml_data))
+
 def _create_json_section(data, title: str) -> str:
     """Создает отформатированную строку для секции с JSON данными."""
     json_str = json.dumps(data, indent=2, ensure_ascii=False)
@@ -27,39 +135,20 @@ def _create_json_section(data, title: str) -> str:
         formatted_json = json_str
     return f"<{title}>\n{formatted_json}\n</{title}>"
 
-def build_ai_prompt(user_request: str, xml_fields: Dict[str, str], template_info: Dict[str, str], existing_attributes: List[Dict[str, Any]], instruction_manual_content: str) -> str:
-    """Constructs the prompt to send to the AI using JSON for data sections."""
+INSTRUCTION_MANUAL = """
+Создание атрибутов
+Для создания атрибута используется метод System Core API / Solution / ObjectAppService / CreateProperty
+...
+(Include the relevant parts of the instruction manual here, or load from a file)
+...
+"""  # Замените на реальное содержимое
 
-    target_template_data = {
-        "id": template_info['id'],
-        "name": template_info['name']
-    }
-    
-    xml_fields_data = []
-    for field_name, example_value in xml_fields.items():
-        safe_example = repr(str(example_value))[1:-1]
-        xml_fields_data.append({
-            "name": field_name,
-            "example": safe_example 
-        })
-
-    existing_attributes_data = []
-    if existing_attributes:
-        for attr in existing_attributes:
-            alias = attr.get('alias', attr.get('Alias', attr.get('name', 'Unknown')))
-            name = attr.get('attributes', {}).get('Name', alias) 
-            type_info = attr.get('type', attr.get('Type', 'Unknown'))
-            existing_attributes_data.append({
-                "alias": alias,
-                "name": name,
-                "type": type_info
-            })
-
-    requirements_section = """\
+# {max_attributes} подставляется из размера чанка; для одного размера текст остаётся байт-в-байт одинаковым
+REQUIREMENTS_TEMPLATE = """\
 1.  Analyze the task description, XML fields data, and existing attributes data.
 2.  Using the provided instruction manual, generate JSON objects for the Platform API method `/Solution/ObjectAppService/CreateProperty` to create NEW attributes in the specified template that correspond to the XML fields NOT already covered by existing attributes.
 3.  Ensure the generated JSONs are valid and conform to the Platform API schema described in the instruction manual.
-4.  CRITICAL: Do not generate JSON for attributes that already exist (based on alias or name). Check the `<existing_attributes_data>` list carefully.
+4.  CRITICAL: Do not generate JSON for attributes that already exist (based on alias or name). Check the `<existing_attributes_data>` list carefully. An XML field with a `similar_existing_attribute` most likely already exists under that alias (e.g. in another language or spelling): skip it unless its example clearly means something different.
 5.  Prioritize creating attributes that map directly to the provided XML fields.
 6.  CRITICAL FORMAT INSTRUCTION: Respond ONLY with a JSON array containing objects in the EXACT format shown below. Do not include any other text, explanations, markdown, or JSON-RPC wrappers. The array should be valid JSON that can be parsed directly.
     **Expected Format Example for attributes:**
@@ -90,17 +179,116 @@ def build_ai_prompt(user_request: str, xml_fields: Dict[str, str], template_info
     - Number (Integer) -> Decimal
     - Number (Decimal/Float) -> Decimal
 7.  If all necessary attributes already exist, or no new attributes are needed based on the XML and existing list, return an empty JSON array: [].
-8.  CRITICAL LIMIT: Generate a maximum of 5 attribute definitions in the JSON array, even if more are required by the XML and not present in the existing list. If more than 5 are needed, generate only the first 5 based on the order they appear in the XML or their priority."""
+8.  CRITICAL LIMIT: Generate a maximum of {max_attributes} attribute definitions in the JSON array, even if more are required by the XML and not present in the existing list. If more than {max_attributes} are needed, generate only the first {max_attributes} based on the order they appear in the XML or their priority.
+9.  The task description and all data sections follow below."""
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 UTF-8 bytes per token), good enough for budgeting."""
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+@functools.lru_cache(maxsize=8)
+def build_static_prompt_prefix(instruction_manual_content: str, max_attributes: int = AI_CHUNK_SIZE) -> str:
+    """
+    The part of the prompt that never changes between iterations and chunks.
+    Keeping it byte-identical at the very beginning lets Ollama reuse its prompt cache.
+    """
+    requirements = REQUIREMENTS_TEMPLATE.replace("{max_attributes}", str(max_attributes))
+    return f"<instruction>\n{instruction_manual_content}\n</instruction>\n\n<requirements>\n{requirements}\n</requirements>"
+
+
+def _fit_existing_attributes(existing_attributes: Union[List[Dict[str, Any]], AttributeMatchIndex],
+                             existing_attributes_data: List[Dict[str, Any]],
+                             xml_fields: Dict[str, str], available_tokens: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Returns all existing attributes if they fit; otherwise the ones most similar
+    to the XML fields (top-k per field, best first, as many as fit) — the rest
+    are summarized. Also returns the omitted count. The matching index is built
+    only when trimming is needed and no index was passed in.
+    """
+    if estimate_tokens(_create_json_section(existing_attributes_data, "existing_attributes_data")) <= available_tokens:
+        return existing_attributes_data, 0
+
+    index = existing_attributes
+    if not isinstance(index, AttributeMatchIndex):
+        index = AttributeMatchIndex(existing_attributes)
+    relevant = index.top_k(xml_fields)
+    kept = []
+    used = estimate_tokens("<existing_attributes_data>\n[]\n</existing_attributes_data>")
+    for attr, _ in relevant:
+        cost = estimate_tokens(json.dumps(attr, indent=2, ensure_ascii=False)) + 2
+        if used + cost > available_tokens:
+            break
+        kept.append(attr)
+        used += cost
+    if len(kept) < len(relevant):
+        logger.warning(f"Prompt budget fits only {len(kept)} of {len(relevant)} relevant existing attributes.")
+    return kept, len(existing_attributes_data) - len(kept)
+
+
+@timed("build_ai_prompt")
+def build_ai_prompt(user_request: str, xml_fields: Dict[str, str], template_info: Dict[str, str],
+                    existing_attributes: Union[List[Dict[str, Any]], AttributeMatchIndex],
+                    instruction_manual_content: str, token_budget: Optional[int] = None,
+                    max_attributes: int = AI_CHUNK_SIZE) -> str:
+    """
+    Constructs the prompt to send to the AI using JSON for data sections.
+    The static instruction/requirements prefix comes first and the changing data
+    last. Existing attributes are trimmed to the most similar ones when the
+    prompt would exceed the token budget (context window minus response reserve).
+    max_attributes is the per-response limit stated in the requirements.
+    existing_attributes may be a prebuilt AttributeMatchIndex (see orchestrator),
+    so repeated prompts of one run do not re-index the template; with an index,
+    fields that closely match an existing attribute name it in the prompt.
+    """
+    if token_budget is None:
+        token_budget = OLLAMA_NUM_CTX - PROMPT_RESPONSE_RESERVE_TOKENS
+
+    target_template_data = {
+        "id": template_info['id'],
+        "name": template_info['name']
+    }
+    
+    xml_fields_data = []
+    for field_name, example_value in xml_fields.items():
+        safe_example = repr(str(example_value))[1:-1]
+        field_data = {
+            "name": field_name,
+            "example": safe_example 
+        }
+        if isinstance(existing_attributes, AttributeMatchIndex):
+            match = existing_attributes.best_match(field_name, MATCH_DUPLICATE_SCORE)
+            if match:
+                field_data["similar_existing_attribute"] = match[0]["alias"]
+        xml_fields_data.append(field_data)
+
+    if isinstance(existing_attributes, AttributeMatchIndex):
+        existing_attributes_data = existing_attributes.described
+    else:
+        existing_attributes_data = [describe_existing_attribute(attr) for attr in existing_attributes]
 
     prompt_parts = []
-    prompt_parts.append(f"<instruction>\n{instruction_manual_content}\n</instruction>")
+    prompt_parts.append(build_static_prompt_prefix(instruction_manual_content, max_attributes))
     prompt_parts.append(f"<task_description>\n{user_request}\n</task_description>")
     prompt_parts.append(_create_json_section(target_template_data, "target_template_data"))
     prompt_parts.append(_create_json_section(xml_fields_data, "xml_fields_data"))
-    prompt_parts.append(_create_json_section(existing_attributes_data, "existing_attributes_data"))
-    prompt_parts.append(f"<requirements>\n{requirements_section}\n</requirements>")
+
+    available_tokens = token_budget - estimate_tokens("\n\n".join(prompt_parts)) - 64
+    kept_attributes, omitted = _fit_existing_attributes(existing_attributes, existing_attributes_data, xml_fields,
+                                                        available_tokens)
+    prompt_parts.append(_create_json_section(kept_attributes, "existing_attributes_data"))
+    if omitted:
+        logger.info(f"Prompt budget: omitted {omitted} of {len(existing_attributes_data)} existing attributes.")
+        prompt_parts.append(
+            "<existing_attributes_summary>\n"
+            f"{omitted} more existing attributes were omitted to fit the context window. "
+            "The existing attributes most similar to the XML fields are listed above.\n"
+            "</existing_attributes_summary>"
+        )
     
     prompt = "\n\n".join(prompt_parts)
+    if estimate_tokens(prompt) > token_budget:
+        logger.warning(f"Prompt (~{estimate_tokens(prompt)} tokens) exceeds the budget of {token_budget} tokens.")
 
     logger.debug(f"Constructed AI prompt:\n{prompt}")
-    return prompt
\ No newline at end of file
+    return prompt